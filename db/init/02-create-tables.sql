@@ -1,12 +1,22 @@
 -- Drop tables if they exist (order matters for foreign key constraints)
 -- Drop child tables first, then parent tables
+DROP TABLE IF EXISTS batch_jobs CASCADE;
 DROP TABLE IF EXISTS personalized_content CASCADE;
+DROP TABLE IF EXISTS personalization_variants CASCADE;
+DROP TABLE IF EXISTS text_blocks CASCADE;
+DROP TABLE IF EXISTS target_context_cache CASCADE;
+DROP TABLE IF EXISTS embedding_cache CASCADE;
+DROP TABLE IF EXISTS llm_response_cache CASCADE;
+DROP TABLE IF EXISTS page_cache CASCADE;
+DROP TABLE IF EXISTS rate_limit_buckets CASCADE;
 DROP TABLE IF EXISTS account_industries CASCADE;
 DROP TABLE IF EXISTS accounts CASCADE;
 DROP TABLE IF EXISTS company_info CASCADE;
 DROP TABLE IF EXISTS industries CASCADE;
 DROP TABLE IF EXISTS personas CASCADE;
 DROP TABLE IF EXISTS healthcare_subverticals CASCADE;
+DROP TABLE IF EXISTS table_versions CASCADE;
+DROP FUNCTION IF EXISTS bump_table_version() CASCADE;
 
 -- Create company_info table
 CREATE TABLE IF NOT EXISTS company_info (
@@ -51,6 +61,17 @@ CREATE TABLE IF NOT EXISTS accounts (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Trigram index for substring and prefix search on account names. Django's
+-- icontains/istartswith lookups compare UPPER(name), so the index is on that expression
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_accounts_name_trgm
+ON accounts USING GIN (UPPER(name) gin_trgm_ops);
+
+-- Index for keyset pagination of account names ordered by (name, id)
+CREATE INDEX IF NOT EXISTS idx_accounts_name_id
+ON accounts(name, id);
+
 -- Create account_industries junction table (many-to-many)
 CREATE TABLE IF NOT EXISTS account_industries (
     account_id INTEGER REFERENCES accounts(id) ON DELETE CASCADE,
@@ -58,6 +79,10 @@ CREATE TABLE IF NOT EXISTS account_industries (
     PRIMARY KEY (account_id, industry_id)
 );
 
+-- Index for paging through an industry's accounts in ID order
+CREATE INDEX IF NOT EXISTS idx_account_industries_industry_account
+ON account_industries(industry_id, account_id);
+
 -- Create healthcare_subverticals table
 CREATE TABLE IF NOT EXISTS healthcare_subverticals (
     id SERIAL PRIMARY KEY,
@@ -68,6 +93,36 @@ CREATE TABLE IF NOT EXISTS healthcare_subverticals (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create table_versions table, bumped by triggers whenever a tracked table changes
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(255) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE table_versions IS 'Change counters for tables served with ETags or cached by the app';
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = table_versions.version + 1, updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Bump a table's version once per statement that changes it
+INSERT INTO table_versions (table_name) VALUES ('accounts'), ('company_info') ON CONFLICT DO NOTHING;
+
+CREATE TRIGGER accounts_table_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON accounts
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER company_info_table_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON company_info
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
 -- Create personalized_content table for storing workflow results
 CREATE TABLE IF NOT EXISTS personalized_content (
     id SERIAL PRIMARY KEY,
@@ -76,6 +131,7 @@ CREATE TABLE IF NOT EXISTS personalized_content (
     original_text TEXT NOT NULL,
     personalized_text TEXT NOT NULL,
     text_type VARCHAR(50) NOT NULL,
+    job_key VARCHAR(255) UNIQUE,  -- Per-job idempotency key set by batch workflows
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -87,6 +143,135 @@ ON personalized_content(company_info_id, target_account_id);
 -- Add comment
 COMMENT ON TABLE personalized_content IS 'Stores personalized content generated by the ad content workflow';
 
+-- Create batch_jobs table for the jobs of batch workflows, staged by the web app
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    workflow_id VARCHAR(255) NOT NULL,
+    job_index INTEGER NOT NULL,  -- position of the job in the batch, from 0
+    company_info_id INTEGER NOT NULL,
+    target_account_id INTEGER NOT NULL,
+    target_type VARCHAR(50) NOT NULL,
+    target_text TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (workflow_id, job_index)
+);
+
+COMMENT ON TABLE batch_jobs IS 'Jobs of running batch workflows, paged through by the workflow and deleted as they are handled';
+
+-- Create target_context_cache table for extracted website context
+CREATE TABLE IF NOT EXISTS target_context_cache (
+    url_key VARCHAR(2048) PRIMARY KEY,
+    url VARCHAR(2048) NOT NULL,
+    context TEXT NOT NULL,
+    etag VARCHAR(512),
+    last_modified VARCHAR(128),
+    fetched_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE target_context_cache IS 'Context extracted from target account websites, shared by the web app and the worker';
+
+-- Create embedding_cache table keyed by embedding model and text hash
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key VARCHAR(255) PRIMARY KEY,
+    value BYTEA NOT NULL,
+    last_used_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Index used to evict the least recently used embeddings
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used_at
+ON embedding_cache(last_used_at, key);
+
+COMMENT ON TABLE embedding_cache IS 'Embeddings of scraped text chunks, shared by the web app and the worker';
+
+-- Create llm_response_cache table keyed by a hash of the model, temperature, prompt version and inputs
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    key VARCHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    response TEXT NOT NULL,
+    latency_ms INTEGER,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indexes used to evict expired and least recently used responses
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_created_at
+ON llm_response_cache(created_at);
+
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used_at
+ON llm_response_cache(last_used_at, key);
+
+COMMENT ON TABLE llm_response_cache IS 'Generated personalized texts, shared by the web app and the worker';
+
+-- Create page_cache table for fetched web pages, keyed by normalized URL
+CREATE TABLE IF NOT EXISTS page_cache (
+    url_key VARCHAR(2048) PRIMARY KEY,
+    final_url VARCHAR(2048) NOT NULL,
+    body BYTEA NOT NULL,  -- zlib-compressed response body
+    size_bytes INTEGER NOT NULL,
+    content_type VARCHAR(255),
+    encoding VARCHAR(50),
+    etag VARCHAR(512),
+    last_modified VARCHAR(128),
+    derived JSONB,  -- results computed from the body, e.g. main-content extraction; cleared when it changes
+    fetched_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Index used to evict the least recently fetched pages
+CREATE INDEX IF NOT EXISTS idx_page_cache_fetched_at
+ON page_cache(fetched_at, url_key);
+
+COMMENT ON TABLE page_cache IS 'Fetched web pages, shared by /fetch-url/ and context extraction';
+
+-- Create rate_limit_buckets table for the OpenAI token buckets shared by all processes
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    name VARCHAR(100) PRIMARY KEY,  -- scope and kind, e.g. 'chat:tokens'
+    level DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp()
+);
+
+COMMENT ON TABLE rate_limit_buckets IS 'OpenAI request and token buckets shared by the web app and the worker';
+
+-- Create text_blocks table for the text blocks of the standard landing pages
+CREATE TABLE IF NOT EXISTS text_blocks (
+    id SERIAL PRIMARY KEY,
+    text TEXT NOT NULL,
+    text_hash CHAR(64) NOT NULL,  -- sha256 of the whitespace-normalized text
+    text_type VARCHAR(50) NOT NULL DEFAULT 'web',
+    page_url VARCHAR(2048),
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (text_hash, text_type)
+);
+
+COMMENT ON TABLE text_blocks IS 'Registered landing page text blocks personalized ahead of time for every account';
+
+-- Create personalization_variants table for precomputed personalizations
+CREATE TABLE IF NOT EXISTS personalization_variants (
+    id SERIAL PRIMARY KEY,
+    account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    text_hash CHAR(64) NOT NULL,
+    text_type VARCHAR(50) NOT NULL,
+    personalized_text TEXT NOT NULL,
+    generated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (account_id, text_hash, text_type)
+);
+
+-- Index used to find stale variants to refresh
+CREATE INDEX IF NOT EXISTS idx_personalization_variants_generated_at
+ON personalization_variants(generated_at);
+
+COMMENT ON TABLE personalization_variants IS 'Personalized text blocks per account, served by /api/personalize before live generation';
+
 -- Example queries:
 /*
 -- Get company name
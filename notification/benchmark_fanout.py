@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark notification fan-out across several notification service instances.
+
+Starts N instances in this process sharing one pub/sub backend, connects
+Socket.IO clients to them round-robin and subscribes every client to the same
+workflow room. Notifications are posted to the instances round-robin, as a load
+balancer would, and the time until each client receives them is reported.
+
+The local backend measures the service's own overhead. Use --backend postgres
+or --backend redis (with the DB_* variables or REDIS_URL set) to include the broker.
+
+Usage: python benchmark_fanout.py --instances 2 4 --clients 200 --notifications 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import aiohttp
+import socketio
+from aiohttp import web
+
+# Per-connection logging would dominate the timings
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from main import create_app
+from pubsub import create_client_manager
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(int(len(values) * fraction) - 1, 0)]
+
+
+async def start_instance(backend, channel, port):
+    _, app = create_app(create_client_manager(backend, channel))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def connect_subscriber(url, workflow_id, on_notification):
+    client = socketio.AsyncClient(reconnection=False)
+    subscribed = asyncio.Event()
+    client.on("subscribed", lambda data: subscribed.set())
+    client.on("workflow_notification", on_notification)
+    await client.connect(url, transports=["websocket"])
+    await client.emit("subscribe_workflow", {"workflow_id": workflow_id})
+    await asyncio.wait_for(subscribed.wait(), timeout=10)
+    return client
+
+
+async def run_round(backend, instances, clients, notifications, base_port):
+    channel = f"fanout_bench_{uuid.uuid4().hex[:8]}"
+    workflow_id = f"benchmark-{uuid.uuid4().hex[:8]}"
+    ports = [base_port + i for i in range(instances)]
+    runners = [await start_instance(backend, channel, port) for port in ports]
+
+    latencies = {}
+    done = {}
+
+    def on_notification(notification):
+        details = notification["data"]["details"]
+        received = latencies.setdefault(details["seq"], [])
+        received.append(time.perf_counter() - details["sent_at"])
+        if len(received) == clients:
+            done[details["seq"]].set()
+
+    subscribers = await asyncio.gather(*(
+        connect_subscriber(f"http://127.0.0.1:{ports[i % instances]}", workflow_id, on_notification)
+        for i in range(clients)
+    ))
+
+    timeouts = 0
+    async with aiohttp.ClientSession() as session:
+        for seq in range(notifications):
+            done[seq] = asyncio.Event()
+            payload = {
+                "workflow_id": workflow_id,
+                "status": "in_progress",
+                "details": {"seq": seq, "sent_at": time.perf_counter()}
+            }
+            url = f"http://127.0.0.1:{ports[seq % instances]}/send-workflow-notification"
+            async with session.post(url, json=payload) as response:
+                response.raise_for_status()
+            try:
+                await asyncio.wait_for(done[seq].wait(), timeout=10)
+            except asyncio.TimeoutError:
+                timeouts += 1
+
+    for subscriber in subscribers:
+        await subscriber.disconnect()
+    for runner in runners:
+        await runner.cleanup()
+
+    deliveries = [latency for received in latencies.values() for latency in received]
+    fan_out = [max(received) for received in latencies.values()]
+    print(f"Instances: {instances}")
+    print(f"  Deliveries:       {len(deliveries)}/{clients * notifications} ({timeouts} notifications timed out)")
+    if deliveries:
+        print(f"  Delivery p50:     {statistics.median(deliveries) * 1000:.1f}ms")
+        print(f"  Delivery p95:     {percentile(deliveries, 0.95) * 1000:.1f}ms")
+        print(f"  Delivery max:     {max(deliveries) * 1000:.1f}ms")
+        print(f"  Full fan-out p50: {statistics.median(fan_out) * 1000:.1f}ms")
+        print(f"  Full fan-out p95: {percentile(fan_out, 0.95) * 1000:.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark fan-out across notification service instances")
+    parser.add_argument("--backend", default="local", choices=["local", "postgres", "redis"],
+                        help="Pub/sub backend shared by the instances")
+    parser.add_argument("--instances", type=int, nargs="+", default=[2, 4], help="Instance counts to run")
+    parser.add_argument("--clients", type=int, default=200, help="Subscribed clients, spread over the instances")
+    parser.add_argument("--notifications", type=int, default=50, help="Notifications sent per round")
+    parser.add_argument("--base-port", type=int, default=8800, help="Port of the first instance")
+    args = parser.parse_args()
+
+    print(f"Backend: {args.backend}, clients: {args.clients}, notifications: {args.notifications}")
+    for instances in args.instances:
+        await run_round(args.backend, instances, args.clients, args.notifications, args.base_port)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
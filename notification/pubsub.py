@@ -0,0 +1,142 @@
+"""
+Socket.IO client managers that let several notification service instances
+share rooms and emits.
+
+Each instance keeps its own room membership. Emits are published to a broker
+and every instance, including the publisher, delivers them to the members of
+the room it has locally. PUBSUB_BACKEND selects the broker:
+
+- memory: no broker; rooms and emits stay in one process (the default)
+- redis: a Redis-compatible broker at REDIS_URL
+- postgres: LISTEN/NOTIFY on the database configured by the DB_* variables
+- local: an in-process broker shared by every server in the same process,
+  for tests and benchmarks that run several instances side by side
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = "socketio"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+POSTGRES_MAX_PAYLOAD_BYTES = 7999
+
+
+class AsyncLocalPubSubManager(AsyncPubSubManager):
+    """Client manager publishing through queues shared by every manager in the process."""
+
+    name = "asynclocal"
+
+    # Subscriber queues per channel, shared by every instance
+    _subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+
+    async def _publish(self, data):
+        # Serialize like a real broker would, so nothing passes by reference
+        message = json.dumps(data)
+        for queue in list(self._subscribers[self.channel]):
+            queue.put_nowait(message)
+
+    async def _listen(self):
+        queue = asyncio.Queue()
+        self._subscribers[self.channel].append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[self.channel].remove(queue)
+
+
+class AsyncPostgresManager(AsyncPubSubManager):
+    """Client manager publishing through Postgres LISTEN/NOTIFY."""
+
+    name = "asyncpostgres"
+
+    def __init__(self, dsn: Optional[str] = None, connect_kwargs: Optional[dict] = None,
+                 channel: str = DEFAULT_CHANNEL, write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.dsn = dsn
+        self.connect_kwargs = connect_kwargs or {}
+        self._publish_pool = None
+        self._publish_pool_lock = asyncio.Lock()
+
+    async def _connect(self):
+        import asyncpg
+        return await asyncpg.connect(self.dsn, **self.connect_kwargs)
+
+    async def _publish(self, data):
+        import asyncpg
+        payload = json.dumps(data)
+        if len(payload.encode("utf-8")) > POSTGRES_MAX_PAYLOAD_BYTES:
+            raise ValueError(f"Message of {len(payload)} characters is too large for NOTIFY")
+        # Connects publish concurrently, and each would otherwise open its own pool
+        async with self._publish_pool_lock:
+            if self._publish_pool is None:
+                self._publish_pool = await asyncpg.create_pool(
+                    self.dsn, min_size=1, max_size=4, **self.connect_kwargs
+                )
+        await self._publish_pool.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def _listen(self):
+        retry_sleep = 1
+        while True:
+            queue = asyncio.Queue()
+            try:
+                connection = await self._connect()
+            except Exception as e:
+                logger.error(f"Cannot connect to Postgres for notifications, retrying in {retry_sleep}s: {str(e)}")
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+                continue
+
+            await connection.add_listener(self.channel, lambda conn, pid, channel, payload: queue.put_nowait(payload))
+            retry_sleep = 1
+            try:
+                while True:
+                    try:
+                        yield await asyncio.wait_for(queue.get(), timeout=5)
+                    except asyncio.TimeoutError:
+                        # Notifications sent while disconnected are lost, so notice drops quickly
+                        if connection.is_closed():
+                            logger.warning("Postgres notification connection closed, reconnecting")
+                            break
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+
+
+def get_postgres_dsn() -> str:
+    """Build a Postgres DSN from the same DB_* variables the web app and worker use."""
+    return "postgresql://{user}:{password}@{host}:{port}/{dbname}".format(
+        host=os.getenv("DB_HOST", "db"),
+        port=os.getenv("DB_PORT", "5432"),
+        dbname=os.getenv("DB_NAME", "addb"),
+        user=os.getenv("DB_USER", "ad_user"),
+        password=os.getenv("DB_PASSWORD", "your_secure_password")
+    )
+
+
+def create_client_manager(backend: Optional[str] = None, channel: Optional[str] = None):
+    """
+    Create the client manager for PUBSUB_BACKEND, or None for the default
+    in-process manager.
+    """
+    backend = (backend or os.getenv("PUBSUB_BACKEND", "memory")).lower()
+    channel = channel or os.getenv("PUBSUB_CHANNEL", DEFAULT_CHANNEL)
+
+    if backend == "memory":
+        return None
+    if backend == "local":
+        return AsyncLocalPubSubManager(channel=channel)
+    if backend == "redis":
+        return socketio.AsyncRedisManager(os.getenv("REDIS_URL", "redis://redis:6379/0"), channel=channel)
+    if backend == "postgres":
+        return AsyncPostgresManager(get_postgres_dsn(), channel=channel)
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {backend}")
@@ -1,3 +1,19 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import PersonalizationVariant, TextBlock
+
+
+@admin.register(TextBlock)
+class TextBlockAdmin(admin.ModelAdmin):
+    list_display = ('text', 'text_type', 'page_url', 'active', 'updated_at')
+    list_filter = ('text_type', 'active')
+    search_fields = ('text',)
+    readonly_fields = ('text_hash',)
+
+
+@admin.register(PersonalizationVariant)
+class PersonalizationVariantAdmin(admin.ModelAdmin):
+    list_display = ('account', 'text_type', 'text_hash', 'generated_at')
+    list_filter = ('text_type',)
+    search_fields = ('account__name', 'personalized_text')
+    raw_id_fields = ('account',)
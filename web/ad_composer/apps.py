@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ad_composer'
+
+    def ready(self):
+        # Web requests are interactive, so they may use the quota the worker leaves in reserve
+        from workflow.rate_limit import INTERACTIVE, set_default_priority
+        set_default_priority(INTERACTIVE)
@@ -0,0 +1,151 @@
+"""
+Personalized content generation shared by the API views and the precompute command.
+"""
+import logging
+import time
+from functools import partial
+
+from django.conf import settings
+
+from .models import Account
+from .personalization import (
+    build_batch_personalization_prompt,
+    build_personalization_prompt,
+    personalize_texts,
+    personalize_texts_batched
+)
+from .table_cache import get_company_info
+from workflow.context_cache import context_cache
+from workflow.context_extraction import extract_context
+from workflow.openai_models import RateLimitedChatOpenAI
+from workflow.response_cache import PROMPT_TEMPLATE_VERSION, response_cache
+
+logger = logging.getLogger(__name__)
+
+
+def get_contextual_information(url):
+    """
+    Get the extracted context for a target account's website.
+    Served from the context cache shared with the workflow worker when possible.
+    """
+    return context_cache.get(url, extract_context)
+
+
+def get_prompt_args(target_account):
+    """
+    Look up the company info and the target account's website context for a
+    personalization request.
+
+    Returns the leading arguments shared by the personalization prompt builders,
+    or raises LookupError if the company info or the target account is missing.
+    """
+    # Get company info (Stmapli), cached per process and reloaded when the table changes
+    company_info = get_company_info()
+    if not company_info:
+        logger.error("No company information found for Stmapli")
+        raise LookupError("No company information found")
+
+    # Get target account details
+    target = Account.objects.filter(name=target_account).first()
+    if not target:
+        logger.error(f"Target account not found: {target_account}")
+        raise LookupError(f"Target account not found: {target_account}")
+
+    # Get target account context from their website if available
+    target_context = ""
+    if target.url:
+        target_context = get_contextual_information(target.url)
+        logger.info(f"Retrieved context for target account: {target_account}")
+
+    return (
+        company_info.company_name,
+        company_info.company_description,
+        target_account,
+        target_context
+    )
+
+
+def create_chat_model():
+    """Use LangChain's ChatOpenAI for personalization, waiting for shared rate limit quota."""
+    return RateLimitedChatOpenAI(
+        model="gpt-3.5-turbo",
+        temperature=0.7,
+        max_tokens=1000
+    )
+
+
+def response_cache_keys(chat_model, prompt_args, texts):
+    """Response cache keys for personalizing each text with the given prompt arguments."""
+    company_name, company_description, target_account, target_context = prompt_args
+    return [
+        response_cache.make_key(
+            chat_model.model_name,
+            chat_model.temperature,
+            PROMPT_TEMPLATE_VERSION,
+            {
+                "company_name": company_name,
+                "company_description": company_description,
+                "target_account": target_account,
+                "target_context": target_context,
+                "text": text
+            }
+        )
+        for text in texts
+    ]
+
+
+def generate_personalized_texts(prompt_args, texts, mode=None, bypass_cache=False):
+    """
+    Personalize texts, serving repeated ones from the response cache.
+
+    Args:
+        prompt_args: Leading prompt arguments from get_prompt_args
+        texts: Texts to personalize
+        mode: 'concurrent' or 'batched'; defaults to PERSONALIZATION_MODE
+        bypass_cache: Regenerate every text and replace its cached response
+
+    Returns:
+        Personalized texts in the same order as texts
+    """
+    chat_model = create_chat_model()
+
+    # Serve repeated personalizations from the response cache and only generate the rest
+    cache_keys = response_cache_keys(chat_model, prompt_args, texts)
+    cached = response_cache.get_many(cache_keys, bypass=bypass_cache)
+    missing = [i for i, key in enumerate(cache_keys) if key not in cached]
+    missing_texts = [texts[i] for i in missing]
+    generated = []
+
+    # Generate personalized content, either with one batched call per
+    # token-budget-sized group of texts or with one call per text, running
+    # up to the configured number of model calls concurrently
+    generation_started = time.perf_counter()
+    mode = mode or settings.PERSONALIZATION_MODE
+    if missing_texts and mode == 'batched':
+        generated = personalize_texts_batched(
+            chat_model,
+            missing_texts,
+            build_prompt=partial(build_personalization_prompt, *prompt_args),
+            build_batch_prompt=partial(build_batch_personalization_prompt, *prompt_args),
+            token_budget=settings.PERSONALIZATION_BATCH_TOKEN_BUDGET,
+            max_concurrency=settings.PERSONALIZATION_MAX_CONCURRENCY
+        )
+    elif missing_texts:
+        prompts = [build_personalization_prompt(*prompt_args, text) for text in missing_texts]
+        generated = personalize_texts(
+            chat_model,
+            prompts,
+            max_concurrency=settings.PERSONALIZATION_MAX_CONCURRENCY
+        )
+
+    if generated:
+        # Store each text with its share of the generation time as the latency a hit saves
+        latency = (time.perf_counter() - generation_started) / len(generated)
+        response_cache.set_many([
+            (cache_keys[i], chat_model.model_name, content, latency)
+            for i, content in zip(missing, generated)
+        ])
+    personalized_texts = [cached.get(key) for key in cache_keys]
+    for i, content in zip(missing, generated):
+        personalized_texts[i] = content
+    return personalized_texts
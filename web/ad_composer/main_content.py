@@ -0,0 +1,94 @@
+"""
+Server-side extraction of a fetched page's main content for /fetch-url/?mode=main.
+Kept free of Django imports so it can be exercised from scripts and benchmarks.
+
+Returns only the contents of the main content region (with URLs made absolute
+and scripts removed), a manifest of the elements that carry text, addressed by
+selectors relative to the element the contents are inserted into, and the
+page's stylesheets and scripts.
+"""
+from bs4 import BeautifulSoup, NavigableString
+
+from .url_rewriter import absolutize_url, rewrite_html
+
+# Part of the page-cache key for the extraction; bump when the output format changes
+MAIN_CONTENT_VERSION = "main-content:v1"
+
+# Candidate main regions, most specific first (the client used the same order)
+MAIN_REGION_SELECTORS = ("main", "[role=main]", ".body-container", "article", "body")
+
+# Elements never shown in the preview
+REMOVED_TAGS = ("script", "noscript", "template", "iframe")
+
+# Elements whose own text is offered for personalization
+TEXT_TAGS = {
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "a", "button", "span", "label",
+    "td", "th", "blockquote", "figcaption", "dt", "dd", "strong", "em", "b", "i", "small", "div"
+}
+
+MAX_MANIFEST_TEXT_CHARS = 200
+
+
+def _own_text(element):
+    """Text directly inside element, excluding text of child elements."""
+    return " ".join(
+        " ".join(str(child).split())
+        for child in element.children
+        if isinstance(child, NavigableString) and str(child).strip()
+    )
+
+
+def _selector(element, root):
+    """Selector for element relative to root, built from tag:nth-of-type() steps."""
+    steps = []
+    while element is not None and element is not root:
+        index = 1 + sum(1 for sibling in element.find_previous_siblings(element.name))
+        steps.append(f"{element.name}:nth-of-type({index})")
+        element = element.parent
+    return ":scope > " + " > ".join(reversed(steps))
+
+
+def extract_main_content(html, page_url):
+    """
+    Extract the main content region of a page.
+
+    Returns:
+        Dictionary with the region's inner HTML, a manifest of text elements
+        ({"selector", "tag", "text"}), and absolute stylesheet and script URLs
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    stylesheets = [
+        absolutize_url(link["href"], page_url)
+        for link in soup.select("link[rel~=stylesheet][href]")
+    ]
+    scripts = [absolutize_url(script["src"], page_url) for script in soup.select("script[src]")]
+
+    region = None
+    for selector in MAIN_REGION_SELECTORS:
+        region = soup.select_one(selector)
+        if region is not None:
+            break
+    if region is None:
+        region = soup
+
+    for tag in region.find_all(list(REMOVED_TAGS)):
+        tag.decompose()
+
+    texts = []
+    for element in region.find_all(list(TEXT_TAGS)):
+        text = _own_text(element)
+        if text:
+            texts.append({
+                "selector": _selector(element, region),
+                "tag": element.name,
+                "text": text[:MAX_MANIFEST_TEXT_CHARS]
+            })
+
+    return {
+        "url": page_url,
+        "html": rewrite_html(region.decode_contents(), page_url),
+        "texts": texts,
+        "stylesheets": stylesheets,
+        "scripts": scripts
+    }
@@ -0,0 +1,83 @@
+import logging
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ad_composer.models import Account, PersonalizationVariant, TextBlock
+from ad_composer.precompute import precompute_variants
+from workflow.rate_limit import BATCH, set_default_priority
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Personalize every active text block for every account and store the variants "
+        "served by /api/personalize. Existing variants are regenerated unless --missing-only is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--account",
+            action="append",
+            dest="accounts",
+            help="Only precompute for the account with this name (repeatable)"
+        )
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only generate variants that don't exist yet, reusing cached model responses"
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["concurrent", "batched"],
+            help="Personalization mode; defaults to PERSONALIZATION_MODE"
+        )
+
+    def handle(self, *args, **options):
+        # A bulk job, so leave the interactive share of the rate limit to the web app
+        set_default_priority(BATCH)
+
+        # Group the registered text blocks by type, since variants are stored per type
+        blocks = defaultdict(dict)
+        for block in TextBlock.objects.filter(active=True):
+            blocks[block.text_type][block.text_hash] = block.text
+        if not blocks:
+            raise CommandError("No active text blocks registered")
+
+        accounts = Account.objects.order_by("id")
+        if options["accounts"]:
+            accounts = accounts.filter(name__in=options["accounts"])
+
+        generated = failed = 0
+        for account in accounts.iterator():
+            for text_type, texts_by_hash in blocks.items():
+                hashes = set(texts_by_hash)
+                if options["missing_only"]:
+                    hashes -= set(
+                        PersonalizationVariant.objects.filter(
+                            account=account,
+                            text_type=text_type,
+                            text_hash__in=hashes
+                        ).values_list("text_hash", flat=True)
+                    )
+                if not hashes:
+                    continue
+
+                try:
+                    generated += precompute_variants(
+                        account,
+                        [texts_by_hash[h] for h in hashes],
+                        text_type,
+                        mode=options["mode"],
+                        bypass_cache=not options["missing_only"]
+                    )
+                except Exception as e:
+                    # Keep going so one bad account doesn't stop the whole run
+                    failed += 1
+                    logger.error(f"Failed to precompute {text_type} variants for {account.name}: {e}")
+                    self.stderr.write(f"Failed: {account.name} ({text_type}): {e}")
+                    continue
+                self.stdout.write(f"{account.name}: {len(hashes)} {text_type} variants")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated {generated} variants ({failed} failures)"))
@@ -1,5 +1,10 @@
 from django.db import models
 
+from .personalization import text_hash
+
+# Text type of landing page text blocks when a request doesn't name one
+DEFAULT_TEXT_TYPE = 'web'
+
 class CompanyInfo(models.Model):
     """Model for company information."""
     company_name = models.CharField(max_length=255, null=True)
@@ -59,6 +64,19 @@ class Account(models.Model):
         return self.name
 
 
+class TableVersion(models.Model):
+    """Model for the change counters bumped by triggers on tracked tables."""
+    table_name = models.CharField(max_length=255, primary_key=True)
+    version = models.BigIntegerField()
+    updated_at = models.DateTimeField(null=True)
+    
+    class Meta:
+        db_table = 'table_versions'
+    
+    def __str__(self):
+        return f"{self.table_name} v{self.version}"
+
+
 class HealthcareSubvertical(models.Model):
     """Model for healthcare subverticals."""
     name = models.CharField(max_length=255)
@@ -71,3 +89,65 @@ class HealthcareSubvertical(models.Model):
     
     def __str__(self):
         return self.name
+
+
+class TextBlock(models.Model):
+    """Model for landing page text blocks personalized ahead of time."""
+    text = models.TextField()
+    text_hash = models.CharField(max_length=64)
+    text_type = models.CharField(max_length=50, default=DEFAULT_TEXT_TYPE)
+    page_url = models.URLField(max_length=2048, null=True, blank=True)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'text_blocks'
+        verbose_name_plural = 'Text Blocks'
+        unique_together = ('text_hash', 'text_type')
+    
+    def save(self, *args, **kwargs):
+        self.text_hash = text_hash(self.text)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return self.text[:80]
+
+
+class PersonalizationVariant(models.Model):
+    """Model for a text block personalized for an account."""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, db_column='account_id')
+    text_hash = models.CharField(max_length=64)
+    text_type = models.CharField(max_length=50)
+    personalized_text = models.TextField()
+    generated_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'personalization_variants'
+        verbose_name_plural = 'Personalization Variants'
+        unique_together = ('account', 'text_hash', 'text_type')
+    
+    def __str__(self):
+        return f"{self.account_id}:{self.text_type}:{self.text_hash[:12]}"
+
+
+class BatchJob(models.Model):
+    """Model for a job of a batch workflow, staged before the workflow starts."""
+    id = models.BigAutoField(primary_key=True)
+    workflow_id = models.CharField(max_length=255)
+    job_index = models.IntegerField()
+    company_info_id = models.IntegerField()
+    target_account_id = models.IntegerField()
+    target_type = models.CharField(max_length=50)
+    target_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'batch_jobs'
+        verbose_name_plural = 'Batch Jobs'
+        unique_together = ('workflow_id', 'job_index')
+    
+    def __str__(self):
+        return f"{self.workflow_id}:{self.job_index}"
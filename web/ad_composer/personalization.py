@@ -0,0 +1,224 @@
+"""
+Helpers for generating personalized content with a LangChain chat model.
+Kept free of Django imports so they can be exercised from scripts and benchmarks.
+"""
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Key of the JSON array returned by batched personalization calls
+BATCH_RESPONSE_KEY = "personalized"
+
+# The response cache key's template version is workflow.response_cache.PROMPT_TEMPLATE_VERSION;
+# bump it when the prompts below change
+
+
+def text_hash(text):
+    """Hash of a text with its whitespace normalized, identifying it across pages and requests."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def build_personalization_prompt(company_name, company_description, target_account, target_context, text):
+    """Build the prompt used to personalize a single marketing text."""
+    return f"""
+            You are a marketing expert specializing in personalized B2B content creation.
+
+            Your company (content creator): {company_name}
+            Your company description: {company_description}
+
+            Target client: {target_account}
+            Target client's website context: {target_context}
+
+            Original Marketing Text: {text}
+
+            Personalization Guidelines:
+            - Keep the personalized text consise and rougly the same length as the original marketing text
+            - Tailor our ({company_name}) content specifically for {target_account}'s needs and challenges
+            - Maintain a professional B2B tone while being compelling and relevant
+            - Don't add quotes unless original text contains quotes
+
+            Personalized version:
+            """
+
+
+def build_batch_personalization_prompt(company_name, company_description, target_account, target_context, texts):
+    """Build a single prompt that personalizes several marketing texts at once."""
+    numbered_texts = "\n".join(f"            {i + 1}. {json.dumps(text)}" for i, text in enumerate(texts))
+    return f"""
+            You are a marketing expert specializing in personalized B2B content creation.
+
+            Your company (content creator): {company_name}
+            Your company description: {company_description}
+
+            Target client: {target_account}
+            Target client's website context: {target_context}
+
+            Original Marketing Texts (numbered JSON strings):
+{numbered_texts}
+
+            Personalization Guidelines:
+            - Personalize each original text independently
+            - Keep each personalized text consise and rougly the same length as its original marketing text
+            - Tailor our ({company_name}) content specifically for {target_account}'s needs and challenges
+            - Maintain a professional B2B tone while being compelling and relevant
+            - Don't add quotes unless original text contains quotes
+
+            Respond with a JSON object of the form {{"{BATCH_RESPONSE_KEY}": [...]}} whose array contains
+            exactly {len(texts)} strings, where item N is the personalized version of original text N.
+            """
+
+
+def count_tokens(chat_model, text):
+    """Count prompt tokens with the model's tokenizer, falling back to a rough estimate."""
+    try:
+        return chat_model.get_num_tokens(text)
+    except (AttributeError, NotImplementedError):
+        return len(text) // 4 + 1
+
+
+def plan_batches(chat_model, texts, base_tokens, token_budget):
+    """
+    Group text indices so each batched call stays within token_budget.
+
+    A call costs the shared prompt (base_tokens) plus, for every text, its own
+    tokens and roughly as many again for its personalized version.
+    """
+    groups = []
+    current = []
+    used = base_tokens
+    for index, text in enumerate(texts):
+        cost = 2 * count_tokens(chat_model, text) + 10
+        if current and used + cost > token_budget:
+            groups.append(current)
+            current = []
+            used = base_tokens
+        current.append(index)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+def parse_batch_response(content, expected_count):
+    """Return the personalized texts from a batched response, or None if malformed or mis-sized."""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    items = data.get(BATCH_RESPONSE_KEY) if isinstance(data, dict) else data
+    if not isinstance(items, list) or len(items) != expected_count:
+        return None
+    if not all(isinstance(item, str) and item.strip() for item in items):
+        return None
+    return items
+
+
+def personalize_texts(chat_model, prompts, max_concurrency=1):
+    """
+    Run one chat model call per prompt and return the generated contents.
+
+    With max_concurrency > 1 the calls run on a bounded thread pool, so the
+    total latency approaches that of the slowest call instead of the sum.
+    Results are always returned in the same order as the prompts.
+    """
+    if max_concurrency <= 1 or len(prompts) <= 1:
+        results = []
+        for prompt in prompts:
+            results.append(chat_model.invoke(prompt).content)
+            logger.info(f"Generated personalized content for text #{len(results)}")
+        return results
+
+    def invoke(indexed_prompt):
+        index, prompt = indexed_prompt
+        content = chat_model.invoke(prompt).content
+        logger.info(f"Generated personalized content for text #{index + 1}")
+        return content
+
+    workers = min(max_concurrency, len(prompts))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # executor.map yields results in submission order
+        return list(executor.map(invoke, enumerate(prompts)))
+
+
+def _timed_invoke(chat_model, prompt):
+    """Call the model and return the content and the call's duration in seconds."""
+    started = time.perf_counter()
+    content = chat_model.invoke(prompt).content
+    return content, time.perf_counter() - started
+
+
+def iter_personalized_texts(chat_model, prompts, max_concurrency=1):
+    """
+    Run one chat model call per prompt and yield (index, content, seconds)
+    tuples as soon as each call completes, so callers can stream partial
+    results. seconds is that call's own duration, excluding time queued
+    behind other calls.
+    """
+    workers = max(1, min(max_concurrency, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_timed_invoke, chat_model, prompt): index
+            for index, prompt in enumerate(prompts)
+        }
+        try:
+            for future in as_completed(futures):
+                content, seconds = future.result()
+                yield futures[future], content, seconds
+        finally:
+            # Don't start remaining calls if the consumer stopped early
+            for future in futures:
+                future.cancel()
+
+
+def personalize_texts_batched(chat_model, texts, build_prompt, build_batch_prompt, token_budget, max_concurrency=1):
+    """
+    Personalize texts with as few model calls as the token budget allows.
+
+    Texts are grouped so that each group fits token_budget and every group is
+    sent as one JSON-mode call that returns an array aligned with its inputs.
+    Groups whose response is malformed or mis-sized are split in half and
+    retried, down to single texts which use the regular per-text prompt.
+
+    Args:
+        chat_model: LangChain chat model
+        texts: Texts to personalize
+        build_prompt: Callable building the per-text prompt for one text
+        build_batch_prompt: Callable building the batched prompt for a list of texts
+        token_budget: Maximum prompt plus expected output tokens per call
+        max_concurrency: Maximum number of groups processed concurrently
+
+    Returns:
+        Personalized texts in the same order as texts
+    """
+    # A group's output can exceed the model's per-text max_tokens, so cap it by the budget instead
+    batch_model = chat_model.bind(response_format={"type": "json_object"}, max_tokens=token_budget)
+    base_tokens = count_tokens(chat_model, build_batch_prompt([]))
+    groups = plan_batches(chat_model, texts, base_tokens, token_budget)
+    logger.info(f"Personalizing {len(texts)} texts in {len(groups)} batched calls")
+
+    def personalize_group(group_texts):
+        if len(group_texts) == 1:
+            return [chat_model.invoke(build_prompt(group_texts[0])).content]
+
+        response = batch_model.invoke(build_batch_prompt(group_texts))
+        items = parse_batch_response(response.content, len(group_texts))
+        if items is not None:
+            return items
+
+        logger.warning(f"Malformed batched response for {len(group_texts)} texts, splitting the batch")
+        middle = len(group_texts) // 2
+        return personalize_group(group_texts[:middle]) + personalize_group(group_texts[middle:])
+
+    group_texts = [[texts[i] for i in group] for group in groups]
+    if max_concurrency <= 1 or len(group_texts) <= 1:
+        group_results = [personalize_group(group) for group in group_texts]
+    else:
+        workers = min(max_concurrency, len(group_texts))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            group_results = list(executor.map(personalize_group, group_texts))
+
+    return [item for items in group_results for item in items]
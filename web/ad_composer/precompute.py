@@ -0,0 +1,130 @@
+"""
+Precomputed personalizations of the registered landing page text blocks.
+
+The precompute_personalizations command generates a variant of every active
+text block for every account, stored by (account, text hash, text type).
+/api/personalize serves texts with a stored variant without calling the model,
+and variants older than PRECOMPUTED_VARIANT_TTL_SECONDS are served while they
+are regenerated in the background.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .generation import generate_personalized_texts, get_prompt_args
+from .models import PersonalizationVariant, TextBlock
+from .personalization import text_hash
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Background refreshes of stale variants; a small pool so refreshes never crowd out live requests
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="variant-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def lookup_variants(account, texts, text_type):
+    """
+    Look up stored variants of texts for an account.
+
+    Returns:
+        Dictionary mapping the index of each text with a variant to its PersonalizationVariant
+    """
+    hashes = [text_hash(text) for text in texts]
+    variants = {
+        variant.text_hash: variant
+        for variant in PersonalizationVariant.objects.filter(
+            account=account,
+            text_type=text_type,
+            text_hash__in=set(hashes)
+        )
+    }
+    found = {i: variants[h] for i, h in enumerate(hashes) if h in variants}
+    metrics.incr("precomputed.hit", len(found))
+    metrics.incr("precomputed.miss", len(texts) - len(found))
+    return found
+
+
+def is_stale(variant):
+    """Whether a variant is older than PRECOMPUTED_VARIANT_TTL_SECONDS."""
+    max_age = timedelta(seconds=settings.PRECOMPUTED_VARIANT_TTL_SECONDS)
+    return variant.generated_at < timezone.now() - max_age
+
+
+def registered_texts(texts, text_type):
+    """The set of texts that belong to an active registered text block of text_type."""
+    registered = set(
+        TextBlock.objects.filter(
+            active=True,
+            text_type=text_type,
+            text_hash__in={text_hash(text) for text in texts}
+        ).values_list('text_hash', flat=True)
+    )
+    return {text for text in texts if text_hash(text) in registered}
+
+
+def save_variants(account, text_type, texts, personalized_texts):
+    """Store personalized texts as the account's variants, replacing existing ones."""
+    now = timezone.now()
+    variants = {
+        text_hash(text): PersonalizationVariant(
+            account=account,
+            text_hash=text_hash(text),
+            text_type=text_type,
+            personalized_text=content,
+            generated_at=now,
+            created_at=now,
+            updated_at=now
+        )
+        for text, content in zip(texts, personalized_texts)
+        if content
+    }
+    PersonalizationVariant.objects.bulk_create(
+        variants.values(),
+        update_conflicts=True,
+        unique_fields=['account', 'text_hash', 'text_type'],
+        update_fields=['personalized_text', 'generated_at', 'updated_at']
+    )
+    return len(variants)
+
+
+def precompute_variants(account, texts, text_type, mode=None, bypass_cache=True):
+    """
+    Generate and store the account's variants of texts.
+    The response cache is bypassed by default so existing variants are actually regenerated.
+    """
+    prompt_args = get_prompt_args(account.name)
+    personalized_texts = generate_personalized_texts(prompt_args, texts, mode=mode, bypass_cache=bypass_cache)
+    return save_variants(account, text_type, texts, personalized_texts)
+
+
+def _refresh(key, account, texts, text_type):
+    try:
+        count = precompute_variants(account, texts, text_type)
+        metrics.incr("precomputed.refreshed", count)
+        logger.info(f"Refreshed {count} stale variants for account {account.name}")
+    except Exception as e:
+        metrics.incr("precomputed.refresh_error")
+        logger.warning(f"Failed to refresh variants for account {account.name}: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+        # Each executor thread has its own database connection
+        connection.close()
+
+
+def schedule_refresh(account, texts, text_type):
+    """Regenerate stale variants in the background, unless a refresh for them is already running."""
+    key = (account.pk, text_type, frozenset(text_hash(text) for text in texts))
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    metrics.incr("precomputed.stale", len(texts))
+    _refresh_executor.submit(_refresh, key, account, list(texts), text_type)
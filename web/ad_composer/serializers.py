@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CompanyInfo
+from .models import DEFAULT_TEXT_TYPE, CompanyInfo
 
 class CompanyInfoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,6 +13,12 @@ class PersonalizationRequestSerializer(serializers.Serializer):
         required=True,
         min_length=1
     )
+    mode = serializers.ChoiceField(
+        choices=['concurrent', 'batched'],
+        required=False
+    )
+    text_type = serializers.CharField(required=False, default=DEFAULT_TEXT_TYPE, max_length=50)
+    bypass_cache = serializers.BooleanField(required=False, default=False)
     
     def validate_texts(self, value):
         if not all(value):
@@ -39,8 +45,35 @@ class BatchPersonalizationRequestSerializer(serializers.Serializer):
         required=True,
         min_length=1
     )
+    bypass_cache = serializers.BooleanField(required=False, default=False)
     
     def validate_jobs(self, value):
         if not value:
             raise serializers.ValidationError("At least one job must be provided")
-        return value
\ No newline at end of file
+        return value
+
+class AccountSelectorSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=['all', 'industry', 'ids'], required=True)
+    industry_id = serializers.IntegerField(required=False)
+    account_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        min_length=1
+    )
+    
+    def validate(self, data):
+        if data['kind'] == 'industry' and data.get('industry_id') is None:
+            raise serializers.ValidationError("industry_id is required for the industry selector")
+        if data['kind'] == 'ids' and not data.get('account_ids'):
+            raise serializers.ValidationError("account_ids is required for the ids selector")
+        return data
+
+class SegmentBatchPersonalizationRequestSerializer(serializers.Serializer):
+    company_info_id = serializers.IntegerField(required=True)
+    selector = AccountSelectorSerializer(required=True)
+    personalization_targets = serializers.ListField(
+        child=PersonalizationTargetSerializer(),
+        required=True,
+        min_length=1
+    )
+    bypass_cache = serializers.BooleanField(required=False, default=False)
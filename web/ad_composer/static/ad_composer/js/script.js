@@ -3,28 +3,18 @@ let frame = null;
 async function loadUrl() {
     const url = document.getElementById('urlInput').value;
     try {
-        const response = await fetch(`/fetch-url/?url=${encodeURIComponent(url)}`);
+        // The server returns only the main content, so there is no full page to parse here
+        const response = await fetch(`/fetch-url/?url=${encodeURIComponent(url)}&mode=main`);
 
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
-        const content = await response.text();
-        const contentContainer = document.createElement('div');
-        contentContainer.innerHTML = content;
-
-        const mainContent = contentContainer.querySelector('main') ||
-            contentContainer.querySelector('.body-container') ||
-            contentContainer.querySelector('body');
+        const page = await response.json();
 
         const rightColumn = document.querySelector('.right-column');
-        rightColumn.innerHTML = '';
-
-        if (mainContent) {
-            rightColumn.appendChild(mainContent);
-        } else {
-            rightColumn.innerHTML = content;
-        }
+        rightColumn.innerHTML = page.html;
+        markTextCandidates(rightColumn, page.texts);
 
         frame = {
             document: {
@@ -37,7 +27,7 @@ async function loadUrl() {
         document.getElementById('selectionInstruction').style.display = 'block';
         document.getElementById('selectedElements').style.display = 'block';
 
-        loadExternalResources(contentContainer);
+        loadExternalResources(page.stylesheets, page.scripts);
 
     } catch (error) {
         console.error('Error loading URL:', error);
@@ -46,6 +36,21 @@ async function loadUrl() {
     }
 }
 
+function markTextCandidates(container, texts) {
+    // Selectors in the manifest are relative to the element the content was inserted into
+    texts.forEach(text => {
+        const element = container.querySelector(text.selector);
+        if (element) {
+            element.dataset.textCandidate = 'true';
+        }
+    });
+}
+
+function selectableElement(target) {
+    // Prefer the enclosing element the server identified as carrying text
+    return target.closest('[data-text-candidate]') || target;
+}
+
 function enableSelectionMode() {
     try {
         if (frame && frame.document && frame.document.body) {
@@ -77,19 +82,19 @@ function disableSelectionMode() {
 
 function handleMouseOver(e) {
     e.stopPropagation();
-    e.target.classList.add('hover-highlight');
+    selectableElement(e.target).classList.add('hover-highlight');
 }
 
 function handleMouseOut(e) {
     e.stopPropagation();
-    e.target.classList.remove('hover-highlight');
+    selectableElement(e.target).classList.remove('hover-highlight');
 }
 
 function handleClick(e) {
     e.preventDefault();
     e.stopPropagation();
 
-    const element = e.target;
+    const element = selectableElement(e.target);
     element.classList.toggle('selected-element');
     updateSelectedElementsList(element);
 }
@@ -129,44 +134,77 @@ function removeSelectedListItem(elementId) {
     }
 }
 
-function loadExternalResources(containerElement) {
-    const stylesheets = containerElement.querySelectorAll('link[rel="stylesheet"]');
-    stylesheets.forEach(link => {
+function loadExternalResources(stylesheets, scripts) {
+    stylesheets.forEach(href => {
         const newLink = document.createElement('link');
         newLink.rel = 'stylesheet';
-        newLink.href = link.href;
+        newLink.href = href;
         document.head.appendChild(newLink);
     });
 
-    const scripts = containerElement.querySelectorAll('script[src]');
-    scripts.forEach(script => {
+    scripts.forEach(src => {
         const newScript = document.createElement('script');
-        newScript.src = script.src;
+        newScript.src = src;
         document.head.appendChild(newScript);
     });
 }
 
-async function fetchTargets() {
+// Cursor for the next page of the current target search, or null when there is none
+let targetsCursor = null;
+let targetsQuery = '';
+let targetSearchTimer = null;
+
+async function fetchTargets(query = '', cursor = null) {
     try {
-        const response = await fetch('/api/account-names');
-        const targets = await response.json();
+        const params = new URLSearchParams({ q: query });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        const response = await fetch(`/api/account-names?${params}`);
+        const page = await response.json();
         const targetsDropdown = document.getElementById('targetsDropdown');
 
-        while (targetsDropdown.options.length > 1) {
-            targetsDropdown.remove(1);
+        if (query !== targetsQuery) {
+            // A newer search started while this page was loading
+            return;
+        }
+
+        if (!cursor) {
+            while (targetsDropdown.options.length > 1) {
+                targetsDropdown.remove(1);
+            }
         }
 
-        targets.forEach(targetName => {
+        // Results are compact [id, name] pairs; personalization is keyed by name
+        page.results.forEach(([id, targetName]) => {
             const option = document.createElement('option');
             option.value = targetName;
             option.textContent = targetName;
+            option.dataset.accountId = id;
             targetsDropdown.appendChild(option);
         });
+
+        targetsCursor = page.next;
+        document.getElementById('moreTargets').style.display = targetsCursor ? 'block' : 'none';
     } catch (error) {
         console.error('Error fetching targets:', error);
     }
 }
 
+function fetchMoreTargets() {
+    if (targetsCursor) {
+        fetchTargets(targetsQuery, targetsCursor);
+    }
+}
+
+document.getElementById('targetSearch').addEventListener('input', event => {
+    clearTimeout(targetSearchTimer);
+    targetSearchTimer = setTimeout(() => {
+        targetsQuery = event.target.value.trim();
+        fetchTargets(targetsQuery);
+    }, 250);
+});
+
 function customizeSelectedTarget() {
     const targetsDropdown = document.getElementById('targetsDropdown');
     const selectedTargetId = targetsDropdown.value;
@@ -189,21 +227,8 @@ function customizeSelectedTarget() {
         texts: selectedTexts
     };
 
-    fetch('/api/personalize', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify(payload)
-    })
-    .then(response => response.json())
-    .then(data => {
-        selectedElements.forEach((element, index) => {
-            if (data.personalizedContent && data.personalizedContent[index]) {
-                element.textContent = data.personalizedContent[index];
-            }
-        });
-
+    personalizeStream(payload, selectedElements)
+    .then(() => {
         disableSelectionMode();
         alert('Content personalized successfully! Selection mode is now disabled.');
     })
@@ -213,5 +238,65 @@ function customizeSelectedTarget() {
     });
 }
 
+async function personalizeStream(payload, selectedElements) {
+    // Each NDJSON line carries one personalized text and its index, so elements
+    // are swapped in as soon as their text is ready
+    const startedAt = performance.now();
+    let firstUpdateAt = null;
+
+    const response = await fetch('/api/personalize/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+
+    if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const handleLine = line => {
+        if (!line.trim()) {
+            return;
+        }
+        const message = JSON.parse(line);
+        if (message.error) {
+            throw new Error(message.details || message.error);
+        }
+        if (message.done) {
+            console.info(`Personalization time to first update: ${message.timeToFirstUpdate}s, total: ${message.totalLatency}s (server)`);
+            return;
+        }
+        const element = selectedElements[message.index];
+        if (element && message.personalizedContent) {
+            element.textContent = message.personalizedContent;
+            if (firstUpdateAt === null) {
+                firstUpdateAt = performance.now();
+            }
+        }
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+
+    const totalMs = performance.now() - startedAt;
+    const firstMs = firstUpdateAt === null ? totalMs : firstUpdateAt - startedAt;
+    console.info(`Personalization time to first update: ${firstMs.toFixed(0)}ms, total: ${totalMs.toFixed(0)}ms (browser)`);
+}
+
 // Initialize the application
 fetchTargets();
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+Process-local caches of rarely changing tables, invalidated through table_versions.
+
+Triggers bump a table's counter in table_versions on every write, so each web
+process only has to compare one counter, at most every check_interval seconds,
+to notice writes made by other processes or scripts such as import_data.py.
+Writes therefore become visible within check_interval seconds.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .models import CompanyInfo, TableVersion
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Marks a cache that has not been loaded yet
+_UNLOADED = object()
+
+
+def table_version(table_name):
+    """The change counter of table_name, or None if it is unknown."""
+    try:
+        return TableVersion.objects.filter(table_name=table_name).values_list('version', flat=True).first()
+    except Exception as e:
+        logger.warning(f"Error reading table version for {table_name}: {e}")
+        return None
+
+
+class TableCache:
+    """Cache of a value loaded from table_name, reloaded when the table's version changes."""
+
+    def __init__(self, table_name, load, check_interval):
+        self.table_name = table_name
+        self._load = load
+        self.check_interval = check_interval
+        self._value = _UNLOADED
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The cached value, checking the table's version if the last check is too old."""
+        with self._lock:
+            if self._value is not _UNLOADED and time.monotonic() - self._checked_at < self.check_interval:
+                return self._value
+
+        version = table_version(self.table_name)
+        with self._lock:
+            # Without a known version, reload on every check so writes still show up in time
+            if self._value is not _UNLOADED and version is not None and version == self._version:
+                self._checked_at = time.monotonic()
+                return self._value
+
+        value = self._load()
+        metrics.incr(f"table_cache.{self.table_name}.reload")
+        with self._lock:
+            self._value = value
+            self._version = version
+            self._checked_at = time.monotonic()
+        return value
+
+
+company_info_cache = TableCache(
+    'company_info',
+    lambda: CompanyInfo.objects.first(),
+    check_interval=settings.COMPANY_INFO_CACHE_CHECK_SECONDS
+)
+
+
+def get_company_info():
+    """The company info record (None if there is none), served from the process-local cache."""
+    return company_info_cache.get()
@@ -0,0 +1,58 @@
+"""
+Process-wide Temporal client shared by the web views.
+
+The client is connected lazily on first use and reused across requests, so
+starting a workflow doesn't pay for a new gRPC connection each time.
+"""
+import asyncio
+import logging
+
+from django.conf import settings
+from temporalio.client import Client
+from temporalio.service import RPCError, RPCStatusCode
+
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = asyncio.Lock()
+
+
+async def get_temporal_client():
+    """Return the shared Temporal client, connecting on first use."""
+    global _client
+    if _client is not None:
+        return _client
+
+    async with _client_lock:
+        if _client is None:
+            logger.info(f"Connecting to Temporal server at {settings.TEMPORAL_HOST}...")
+            _client = await Client.connect(settings.TEMPORAL_HOST)
+            metrics.incr("temporal_client.connects")
+            logger.info(f"Connected to Temporal server: {_client.identity}")
+    return _client
+
+
+def reset_temporal_client():
+    """Drop the shared client so the next call reconnects."""
+    global _client
+    _client = None
+
+
+async def start_workflow(*args, **kwargs):
+    """
+    Start a workflow with the shared client.
+    If the server is unreachable, reconnect once and retry.
+    """
+    client = await get_temporal_client()
+    try:
+        return await client.start_workflow(*args, **kwargs)
+    except RPCError as e:
+        if e.status != RPCStatusCode.UNAVAILABLE:
+            raise
+        logger.warning(f"Temporal server unavailable, reconnecting: {e}")
+        reset_temporal_client()
+        metrics.incr("temporal_client.reconnects")
+        client = await get_temporal_client()
+        return await client.start_workflow(*args, **kwargs)
@@ -0,0 +1,249 @@
+"""
+Incremental rewriting of URLs in fetched HTML so the page can be shown inside the app.
+Kept free of Django imports so it can be exercised from scripts and benchmarks.
+
+Relative and protocol-relative URLs in URL-bearing attributes (src, href,
+srcset, ...) of start tags, and in CSS url() references of style attributes
+and <style> elements, are resolved against the page URL. Text, comments and
+the bodies of script-like elements are copied unchanged. The scanner keeps its
+state between chunks, so a page is rewritten and streamed without building
+intermediate copies of the whole document.
+"""
+import codecs
+import re
+from functools import lru_cache
+from urllib.parse import urljoin
+
+# Attribute names whose value is a single URL
+URL_ATTRIBUTES = ("src", "href", "action", "poster", "data-src", "data-href", "formaction", "background")
+# Attribute names whose value is a comma-separated list of "URL descriptor" candidates
+SRCSET_ATTRIBUTES = ("srcset", "data-srcset", "imagesrcset")
+
+# Elements whose body is raw text rather than markup; only style bodies are rewritten
+RAW_TEXT_ELEMENTS = ("script", "style", "textarea", "title")
+
+# Schemes and prefixes that are left untouched
+_SKIPPED_PREFIXES = ("#", "data:", "javascript:", "mailto:", "tel:", "about:", "blob:")
+
+# A complete start or end tag; quoted attribute values may contain '>'
+_TAG = re.compile(r"""<(?P<end>/?)(?P<name>[a-zA-Z][^\s/>]*)(?P<attrs>(?:"[^"]*"|'[^']*'|[^'">])*)>""")
+
+# The beginning of a tag that may still be incomplete
+_TAG_OPEN = re.compile(r"</?[a-zA-Z]")
+
+_ATTRIBUTE = re.compile(
+    r"""
+    (?P<attr>(?P<name>[^\s"'>/=]+)\s*=\s*)
+    (?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<uq>[^\s"'>]+))
+    """,
+    re.VERBOSE
+)
+
+# Start tags without any of these have no URL to rewrite
+_URL_ATTRIBUTE_HINT = re.compile(r"src|href|action|poster|background|style", re.IGNORECASE)
+
+_CSS_URL = re.compile(r"""(?P<css>url\(\s*)(?P<cq>["']?)(?P<curl>[^"')]*)(?P=cq)(?P<cend>\s*\))""", re.IGNORECASE)
+
+_RAW_TEXT_END = {
+    name: re.compile(rf"</{name}[\s/>]", re.IGNORECASE) for name in RAW_TEXT_ELEMENTS
+}
+
+_SRCSET_SEPARATOR = re.compile(r"\s*,\s*")
+
+# Give up waiting for the end of a tag, comment or style body once this much is buffered
+MAX_PENDING_CHARS = 256 * 1024
+
+
+@lru_cache(maxsize=4096)
+def _join(page_url, value):
+    # Pages repeat the same few URLs many times, and urljoin dominates the rewrite cost
+    return urljoin(page_url, value)
+
+
+def absolutize_url(value, page_url):
+    """Resolve value against page_url, leaving absolute, in-page and non-HTTP URLs unchanged."""
+    stripped = value.strip()
+    if not stripped or stripped.lower().startswith(_SKIPPED_PREFIXES) or "&quot;" in stripped:
+        return value
+    return _join(page_url, stripped)
+
+
+def _absolutize_srcset(value, page_url):
+    candidates = []
+    for candidate in _SRCSET_SEPARATOR.split(value.strip()):
+        if not candidate:
+            continue
+        url, _, descriptor = candidate.partition(" ")
+        url = absolutize_url(url, page_url)
+        candidates.append(f"{url} {descriptor.strip()}" if descriptor.strip() else url)
+    return ", ".join(candidates)
+
+
+def rewrite_css(css, page_url):
+    """Rewrite the url() references of a stylesheet or style attribute."""
+    def replace(match):
+        url = absolutize_url(match.group("curl"), page_url)
+        return f"{match.group('css')}{match.group('cq')}{url}{match.group('cq')}{match.group('cend')}"
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _rewrite_attributes(attrs, page_url):
+    if not _URL_ATTRIBUTE_HINT.search(attrs):
+        return attrs
+
+    def replace(match):
+        attr, name, dq, sq, uq = match.group("attr", "name", "dq", "sq", "uq")
+        name = name.lower()
+        if name not in URL_ATTRIBUTES and name not in SRCSET_ATTRIBUTES and name != "style":
+            return match.group(0)
+
+        if dq is not None:
+            quote, value = '"', dq
+        elif sq is not None:
+            quote, value = "'", sq
+        else:
+            quote, value = '"', uq
+
+        if name == "style":
+            value = rewrite_css(value, page_url)
+        elif name in SRCSET_ATTRIBUTES:
+            value = _absolutize_srcset(value, page_url)
+        else:
+            value = absolutize_url(value, page_url)
+        return f"{attr}{quote}{value}{quote}"
+
+    return _ATTRIBUTE.sub(replace, attrs)
+
+
+class HtmlUrlRewriter:
+    """
+    Rewrites the URLs of an HTML document fed in chunks.
+
+    Text is passed through as soon as it arrives. A tag, comment or style body
+    cut by a chunk boundary is held back until it is complete, so nothing is
+    rewritten in two halves.
+    """
+
+    def __init__(self, page_url):
+        self.page_url = page_url
+        self._pending = ""
+        self._raw_text = None  # name of the raw text element whose body is being copied
+
+    def feed(self, text, final=False):
+        """Rewrite the next chunk; returns the output that is complete so far."""
+        pending = self._pending + text
+        size = len(pending)
+        output = []
+        pos = 0
+        while pos < size:
+            # Past the limit, treat the rest as complete rather than buffering without bound
+            complete = final or size - pos > MAX_PENDING_CHARS
+
+            if self._raw_text:
+                end = _RAW_TEXT_END[self._raw_text].search(pending, pos)
+                if end:
+                    body_end = end.start()
+                elif complete:
+                    body_end = size
+                elif self._raw_text == "style":
+                    break
+                else:
+                    # Keep back what could be the start of the end tag
+                    body_end = max(pos, size - len(self._raw_text) - 2)
+                body = pending[pos:body_end]
+                output.append(rewrite_css(body, self.page_url) if self._raw_text == "style" else body)
+                pos = body_end
+                if not end:
+                    break
+                self._raw_text = None
+                continue
+
+            lt = pending.find("<", pos)
+            if lt < 0:
+                output.append(pending[pos:])
+                pos = size
+                break
+            if lt > pos:
+                output.append(pending[pos:lt])
+                pos = lt
+
+            match = _TAG.match(pending, pos)
+            if match:
+                end, name, attrs = match.group("end", "name", "attrs")
+                if end or not attrs:
+                    output.append(match.group(0))
+                else:
+                    output.append(f"<{name}{_rewrite_attributes(attrs, self.page_url)}>")
+                name = name.lower()
+                if not end and name in RAW_TEXT_ELEMENTS:
+                    self._raw_text = name
+                pos = match.end()
+                continue
+
+            if pending.startswith("<!--", pos):
+                close = pending.find("-->", pos + 4)
+                if close < 0 and not complete:
+                    break
+                close = size if close < 0 else close + 3
+                output.append(pending[pos:close])
+                pos = close
+                continue
+
+            if pending.startswith(("<!", "<?"), pos):
+                # Doctype, CDATA and processing instructions end at the next '>'
+                close = pending.find(">", pos)
+                if close < 0 and not complete:
+                    break
+                close = size if close < 0 else close + 1
+                output.append(pending[pos:close])
+                pos = close
+                continue
+
+            if not complete and (size - pos < 4 or _TAG_OPEN.match(pending, pos)):
+                # A tag or comment still being received
+                break
+            output.append("<")
+            pos += 1
+
+        self._pending = pending[pos:]
+        return "".join(output)
+
+    def close(self):
+        """Return the rest of the document."""
+        return self.feed("", final=True)
+
+
+def rewrite_html(html, page_url):
+    """Rewrite every URL in an HTML document or fragment."""
+    return HtmlUrlRewriter(page_url).feed(html, final=True)
+
+
+def iter_rewritten_html(chunks, page_url):
+    """
+    Rewrite an iterable of HTML text chunks, yielding rewritten chunks as they
+    become available.
+    """
+    rewriter = HtmlUrlRewriter(page_url)
+    for chunk in chunks:
+        rewritten = rewriter.feed(chunk)
+        if rewritten:
+            yield rewritten
+    tail = rewriter.close()
+    if tail:
+        yield tail
+
+
+def iter_decoded(content, encoding=None, chunk_size=64 * 1024):
+    """Decode a byte string in chunks, without splitting multi-byte characters."""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for start in range(0, len(content), chunk_size):
+        text = decoder.decode(content[start:start + chunk_size])
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
@@ -6,6 +6,9 @@ urlpatterns = [
     path('api/account-names', views.get_account_names, name='account-names'),
     path('fetch-url/', views.fetch_url, name='fetch-url'),
     path('api/personalize', views.personalize_content, name='personalize'),
+    path('api/personalize/stream', views.personalize_content_stream, name='personalize-stream'),
     path('api/company-info/', views.get_company_info, name='get_company_info'),
-    path('api/batch-personalize/', views.start_batch_personalization, name='batch-personalize'),
+    path('api/batch-personalize/', views.BatchPersonalizationView.as_view(), name='batch-personalize'),
+    path('api/batch-personalize/segment/', views.SegmentBatchPersonalizationView.as_view(), name='batch-personalize-segment'),
+    path('api/metrics', views.get_metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,48 +1,111 @@
+import base64
+import binascii
 import logging
-import asyncio
+import json
+import uuid
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.db import connection as db_connection
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import RetrievalQA
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from urllib.parse import urljoin, urlparse
-import re
 import requests
 import time
-from .models import Account, CompanyInfo
+from .models import Account, BatchJob
+from .generation import create_chat_model, generate_personalized_texts, get_prompt_args, response_cache_keys
+from .personalization import build_personalization_prompt, iter_personalized_texts
+from .precompute import is_stale, lookup_variants, registered_texts, save_variants, schedule_refresh
+from .table_cache import get_company_info as get_cached_company_info, table_version
+from .main_content import MAIN_CONTENT_VERSION, extract_main_content
+from .url_rewriter import iter_decoded, iter_rewritten_html
 from .serializers import (
     PersonalizationRequestSerializer,
     PersonalizationResponseSerializer,
-    BatchPersonalizationRequestSerializer
+    BatchPersonalizationRequestSerializer,
+    SegmentBatchPersonalizationRequestSerializer
 )
 import openai
-from workflow.ad_content_workflow import PersonalizationJob, PersonalizationTarget
-
-# Import Temporal client
-from temporalio.client import Client
+from workflow.ad_content_workflow import AdContentWorkflowParams, PersonalizationTarget, SegmentBatch
+from workflow.target_activities import AccountSelector
+from workflow.metrics import metrics
+from workflow.page_fetch import page_fetcher
+from workflow.response_cache import response_cache
+from .temporal_client import start_workflow
 
 logger = logging.getLogger(__name__)
 
+# Default and maximum number of accounts per page of /api/account-names
+ACCOUNT_NAMES_PAGE_SIZE = 100
+ACCOUNT_NAMES_MAX_PAGE_SIZE = 1000
+
+def _table_version_etag(table_name):
+    """ETag for responses derived only from table_name, changing whenever the table does."""
+    def etag(request, *args, **kwargs):
+        version = table_version(table_name)
+        return f"{table_name}-{version}" if version is not None else None
+    return etag
+
+def _encode_cursor(name, account_id):
+    return base64.urlsafe_b64encode(json.dumps([name, account_id]).encode()).decode()
+
+def _decode_cursor(cursor):
+    """Decode a page cursor into (name, id), raising ValueError if it is malformed."""
+    try:
+        name, account_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError, binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(name, str) or not isinstance(account_id, int):
+        raise ValueError("Invalid cursor")
+    return name, account_id
+
+# Cache-Control is outermost so 304 responses carry it too
+@cache_control(private=True, max_age=60)
+@condition(etag_func=_table_version_etag('accounts'))
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_account_names(request):
     """
     GET endpoint to retrieve account names from the database.
-    Returns a list of account names.
+    Optional 'q' filters by substring ('match=prefix' for prefix search), 'limit'
+    sets the page size and 'cursor' continues from a previous page's 'next'.
+    Returns {"results": [[id, name], ...], "next": cursor or null}, ordered by name.
     """
     try:
-        # Use Django ORM instead of raw SQL
-        account_names = Account.objects.values_list('name', flat=True)
-        return Response(list(account_names))
+        query = request.GET.get('q', '').strip()
+        limit = min(int(request.GET.get('limit', ACCOUNT_NAMES_PAGE_SIZE)), ACCOUNT_NAMES_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        cursor = request.GET.get('cursor')
+        after = _decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        accounts = Account.objects.order_by('name', 'id')
+        if query:
+            # Both lookups are served by the trigram index on UPPER(name)
+            if request.GET.get('match') == 'prefix':
+                accounts = accounts.filter(name__istartswith=query)
+            else:
+                accounts = accounts.filter(name__icontains=query)
+        if after:
+            # Keyset pagination: name >= last name bounds the (name, id) index scan
+            name, account_id = after
+            accounts = accounts.filter(name__gte=name).filter(Q(name__gt=name) | Q(id__gt=account_id))
+        
+        # Fetch one extra row to know whether there is a next page
+        rows = list(accounts.values_list('id', 'name')[:limit + 1])
+        next_cursor = _encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return Response({"results": rows[:limit], "next": next_cursor})
     
     except Exception as e:
         logger.error(f"Error retrieving account names: {e}")
@@ -53,36 +116,31 @@ def get_account_names(request):
 
 @api_view(['GET'])
 def fetch_url(request):
+    """
+    GET endpoint that proxies a web page for previewing.
+    Streams the page's HTML with absolute URLs, or with mode=main returns JSON
+    with only the main content, a manifest of its text elements, and the page's
+    stylesheets and scripts.
+    """
     url = request.GET.get('url')
+    if not url:
+        return HttpResponse('Error: missing url parameter', status=400)
     try:
-        # Fetch the page content
-        response = requests.get(url, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-        response.raise_for_status()
-        
-        # Get the base URL for resolving relative URLs
-        base_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
-        
-        # Modify HTML to make URLs absolute
-        content = response.text
-        
-        # Replace src attributes
-        content = re.sub(
-            r'(src=["\']\/)([^"\']+)',
-            lambda m: f'src="{urljoin(base_url, m.group(1) + m.group(2))}"',
-            content
-        )
+        if request.GET.get('mode') == 'main':
+            # The extraction is cached with the page and recomputed when the page changes
+            main_content = page_fetcher.get_derived(
+                url,
+                MAIN_CONTENT_VERSION,
+                lambda page: extract_main_content(page.text, page.url)
+            )
+            return JsonResponse(main_content)
         
-        # Replace href attributes
-        content = re.sub(
-            r'(href=["\']\/)([^"\']+)',
-            lambda m: f'href="{urljoin(base_url, m.group(1) + m.group(2))}"',
-            content
-        )
+        # Fetch the page through the page cache shared with context extraction
+        page = page_fetcher.fetch(url)
         
-        # Return the modified HTML directly
-        return HttpResponse(content, content_type='text/html')
+        # Make URLs absolute in one pass per chunk and stream the result
+        chunks = iter_rewritten_html(iter_decoded(page.content, page.encoding), page.url)
+        return StreamingHttpResponse(_iterate_async(chunks), content_type='text/html; charset=utf-8')
     
     except requests.RequestException as e:
         return HttpResponse(f'Error: {str(e)}', status=400)
@@ -98,7 +156,7 @@ def get_company_info(request):
     """
     try:
         # Get the first company info record, since we only have one rn
-        company_info = CompanyInfo.objects.first()
+        company_info = get_cached_company_info()
         
         if not company_info:
             return Response(
@@ -125,6 +183,8 @@ def personalize_content(request):
     POST endpoint to personalize marketing content using OpenAI and LangChain.
     Takes 'client' (target account) and 'texts' in the request body.
     Personalizes Stmapli content for the target account.
+    Texts with a precomputed variant for the account and optional 'text_type'
+    are served without calling the model.
     """
     # Validate request data using serializer
     serializer = PersonalizationRequestSerializer(data=request.data)
@@ -137,66 +197,49 @@ def personalize_content(request):
     # Get validated data
     target_account = serializer.validated_data['client']
     texts = serializer.validated_data['texts']
+    started = time.perf_counter()
     
     try:
-        # Get company info (Stmapli) from database
-        company_info = CompanyInfo.objects.first()
-        if not company_info:
-            logger.error("No company information found for Stmapli")
-            return Response(
-                {"error": "No company information found"}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # Get target account details
-        target = Account.objects.filter(name=target_account).first()
-        if not target:
-            logger.error(f"Target account not found: {target_account}")
-            return Response(
-                {"error": f"Target account not found: {target_account}"}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
+        text_type = serializer.validated_data['text_type']
+        bypass_cache = serializer.validated_data['bypass_cache']
+        personalized_texts = [None] * len(texts)
         
-        # Get target account context from their website if available
-        target_context = ""
-        if target and target.url:
-            target_context = get_contextual_information(target.url)
-            logger.info(f"Retrieved context for target account: {target_account}")
+        # Serve registered text blocks from their precomputed variants, refreshing stale ones in the background
+        account = Account.objects.filter(name=target_account).first()
+        if account and not bypass_cache:
+            variants = lookup_variants(account, texts, text_type)
+            for i, variant in variants.items():
+                personalized_texts[i] = variant.personalized_text
+            stale_texts = [texts[i] for i, variant in variants.items() if is_stale(variant)]
+            if stale_texts:
+                schedule_refresh(account, stale_texts, text_type)
         
-        # Use LangChain's ChatOpenAI for personalization
-        chat_model = ChatOpenAI(
-            model="gpt-3.5-turbo", 
-            temperature=0.7, 
-            max_tokens=1000
-        )
-        
-        # Generate personalized content
-        personalized_texts = []
-        for text in texts:
-            # Enhanced prompt with both company and target information
-            prompt = f"""
-            You are a marketing expert specializing in personalized B2B content creation.
-            
-            Your company (content creator): {company_info.company_name}
-            Your company description: {company_info.company_description}
-            
-            Target client: {target_account}
-            Target client's website context: {target_context}
-            
-            Original Marketing Text: {text}
-            
-            Personalization Guidelines:
-            - Keep the personalized text consise and rougly the same length as the original marketing text
-            - Tailor our ({company_info.company_name}) content specifically for {target_account}'s needs and challenges
-            - Maintain a professional B2B tone while being compelling and relevant
-            - Don't add quotes unless original text contains quotes
-            
-            Personalized version:
-            """
+        # Generate the rest live, storing the results for registered text blocks
+        missing = [i for i, content in enumerate(personalized_texts) if content is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            generated = generate_personalized_texts(
+                get_prompt_args(target_account),
+                missing_texts,
+                mode=serializer.validated_data.get('mode'),
+                bypass_cache=bypass_cache
+            )
+            for i, content in zip(missing, generated):
+                personalized_texts[i] = content
             
-            response = chat_model.invoke(prompt)
-            personalized_texts.append(response.content)
-            logger.info(f"Generated personalized content for text #{len(personalized_texts)}")
+            registered = registered_texts(missing_texts, text_type)
+            if registered:
+                save_variants(
+                    account,
+                    text_type,
+                    [text for text in missing_texts if text in registered],
+                    [content for text, content in zip(missing_texts, generated) if text in registered]
+                )
+        
+        # Nothing is shown until the whole response arrives, so the first update is the last
+        elapsed = time.perf_counter() - started
+        metrics.observe("personalize.time_to_first_update", elapsed)
+        metrics.observe("personalize.total_latency", elapsed)
         
         # Prepare response data
         response_data = {
@@ -213,134 +256,278 @@ def personalize_content(request):
             logger.error(f"Response validation error: {response_serializer.errors}")
             return JsonResponse(response_data, safe=False)
     
+    except LookupError as e:
+        return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+    
     except Exception as e:
         logger.error(f"Personalization error: {e}")
         return Response({
             "error": "Failed to personalize content",
             "details": str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+async def _iterate_async(iterator):
+    """
+    Adapt a blocking iterator for StreamingHttpResponse under ASGI.
+    Django consumes synchronous iterators in full before sending them, which
+    would defeat streaming, so each item is pulled in a worker thread instead.
+    """
+    done = object()
+    while True:
+        item = await sync_to_async(next, thread_sensitive=False)(iterator, done)
+        if item is done:
+            break
+        yield item
+
+@csrf_exempt
+@require_POST
+def personalize_content_stream(request):
+    """
+    POST endpoint that streams personalized content as NDJSON.
+    Takes the same body as /api/personalize and emits one line per text as soon
+    as it is ready, {"index": i, "personalizedContent": "..."}, followed by a
+    final {"done": true, ...} line with the time to first update and total latency.
+    Precomputed variants are sent first, and the account's context is only
+    looked up when some texts have none.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Validate request data using serializer
+    serializer = PersonalizationRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    target_account = serializer.validated_data['client']
+    texts = serializer.validated_data['texts']
+    text_type = serializer.validated_data['text_type']
+    bypass_cache = serializer.validated_data['bypass_cache']
+    started = time.perf_counter()
     
-def get_contextual_information(url):
     try:
-        # Load webpage content
-        loader = WebBaseLoader(url)
-        documents = loader.load()
-        
-        # Log raw document content
-        logger.info(f"Raw document content length: {len(documents[0].page_content)} characters")
-        print(f"Raw Document Content (first 500 chars):\n{documents[0].page_content[:500]}")
+        # Serve registered text blocks from their precomputed variants, refreshing stale ones in the background
+        precomputed = {}
+        account = Account.objects.filter(name=target_account).first()
+        if account and not bypass_cache:
+            variants = lookup_variants(account, texts, text_type)
+            precomputed = {i: variant.personalized_text for i, variant in variants.items()}
+            stale_texts = [texts[i] for i, variant in variants.items() if is_stale(variant)]
+            if stale_texts:
+                schedule_refresh(account, stale_texts, text_type)
         
-        # Split content into chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_documents(documents)
-        
-        # Log split texts
-        logger.info(f"Number of text chunks: {len(texts)}")
-        print("\nText Chunks:")
-        for i, chunk in enumerate(texts[:5], 1):  # Print first 5 chunks
-            print(f"\nChunk {i} (length {len(chunk.page_content)}):")
-            print(chunk.page_content[:500])  # Print first 500 chars of each chunk
-        
-        # Create embeddings and vector store
-        embeddings = OpenAIEmbeddings()
-        vectorstore = Chroma.from_documents(texts, embeddings)
-        
-        # Create retrieval chain
-        qa_chain = RetrievalQA.from_chain_type(
-            ChatOpenAI(temperature=0),
-            chain_type="stuff",
-            retriever=vectorstore.as_retriever()
-        )
+        # Only the remaining texts need the company info, the account's context and the model
+        missing = [i for i in range(len(texts)) if i not in precomputed]
+        if missing:
+            prompt_args = get_prompt_args(target_account)
+            chat_model = create_chat_model()
+            cache_keys = dict(zip(missing, response_cache_keys(chat_model, prompt_args, [texts[i] for i in missing])))
+            registered = registered_texts([texts[i] for i in missing], text_type)
+    except LookupError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"Personalization error: {e}")
+        return JsonResponse({
+            "error": "Failed to personalize content",
+            "details": str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def results():
+        """Yield (index, content): precomputed variants, then cached responses, then generated ones."""
+        for index in sorted(precomputed):
+            yield index, precomputed[index]
+        if not missing:
+            return
         
-        # Query for relevant context
-        context_query = "Extract the key messaging, brand positioning, and main pain points of this company"
-        context = qa_chain.run(context_query)
+        cached = response_cache.get_many([cache_keys[i] for i in missing], bypass=bypass_cache)
+        uncached = [i for i in missing if cache_keys[i] not in cached]
+        for index in missing:
+            if cache_keys[index] in cached:
+                yield index, cached[cache_keys[index]]
         
-        # Log and print extracted context
-        logger.info(f"Extracted Context:\n{context}")
-        print(f"\nExtracted Context:\n{context}")
+        prompts = [build_personalization_prompt(*prompt_args, texts[i]) for i in uncached]
+        for prompt_index, content, seconds in iter_personalized_texts(
+            chat_model,
+            prompts,
+            max_concurrency=settings.PERSONALIZATION_MAX_CONCURRENCY
+        ):
+            index = uncached[prompt_index]
+            # Each text's own call time is the latency a later hit on it saves
+            response_cache.set_many([(cache_keys[index], chat_model.model_name, content, seconds)])
+            yield index, content
+    
+    def save_registered(live):
+        """Store live results for registered text blocks, as /api/personalize does."""
+        live = {index: content for index, content in live.items() if texts[index] in registered}
+        if not live:
+            return
+        try:
+            save_variants(account, text_type, [texts[i] for i in live], list(live.values()))
+        except Exception as e:
+            logger.warning(f"Failed to save personalization variants: {e}")
+        finally:
+            # The stream runs in a pool thread, which otherwise keeps its database connection
+            db_connection.close()
+    
+    def stream():
+        time_to_first_update = None
+        live = {}
+        try:
+            for index, content in results():
+                if time_to_first_update is None:
+                    time_to_first_update = time.perf_counter() - started
+                    metrics.observe("personalize_stream.time_to_first_update", time_to_first_update)
+                if index not in precomputed:
+                    live[index] = content
+                logger.info(f"Streaming personalized content for text #{index + 1}")
+                yield json.dumps({"index": index, "personalizedContent": content}) + "\n"
+        except Exception as e:
+            logger.error(f"Personalization stream error: {e}")
+            yield json.dumps({"error": "Failed to personalize content", "details": str(e)}) + "\n"
         
-        return context
+        total_latency = time.perf_counter() - started
+        metrics.observe("personalize_stream.total_latency", total_latency)
+        # Before the final line, so the variants are stored even if the client disconnects right after it
+        save_registered(live)
+        yield json.dumps({
+            "done": True,
+            "timeToFirstUpdate": time_to_first_update,
+            "totalLatency": total_latency
+        }) + "\n"
     
-    except Exception as e:
-        logger.error(f"Error retrieving contextual information: {e}")
-        print(f"Error: {e}")
-        return ""
-
-@api_view(['POST'])
+    response = StreamingHttpResponse(_iterate_async(stream()), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+    
+@api_view(['GET'])
 @permission_classes([AllowAny])
-@csrf_exempt
-def start_batch_personalization(request):
+def get_metrics(request):
+    """
+    GET endpoint exposing this process's metrics, including context cache hits and misses.
+    """
+    return Response(metrics.snapshot())
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchPersonalizationView(View):
     """
     POST endpoint to start a batch personalization workflow using Temporal.
     Takes a list of personalization jobs in the request body.
     Each job contains company_info_id, target_account_id, and personalization_target.
     
     Returns the workflow ID which can be used to check status in Temporal UI.
+    Runs as an async view and reuses the process-wide Temporal client.
     """
-    # Validate request data using serializer
-    serializer = BatchPersonalizationRequestSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(
-            serializer.errors,
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Get validated data
-    jobs = serializer.validated_data['jobs']
+    http_method_names = ['post']
+    serializer_class = BatchPersonalizationRequestSerializer
     
-    try:
-        # Use sync_to_async to run the async code in a synchronous view
-        import asyncio
+    def build_params(self, validated_data, workflow_id):
+        """
+        Build the workflow arguments from the validated request.
+        Returns the AdContentWorkflowParams and a description of the submitted jobs.
         
-        async def start_workflow():
-            # Connect to Temporal server
-            client = await Client.connect("temporal:7233")
-            logger.info(f"Connected to Temporal server: {client.identity}")
-            
-            # Convert serialized jobs to PersonalizationJob objects
-            personalization_jobs = []
-            for job in jobs:
-                # Create PersonalizationTarget object
-                target = PersonalizationTarget(
-                    type=job['personalization_target']['type'],
-                    text=job['personalization_target']['text']
-                )
-                
-                # Create PersonalizationJob object
-                personalization_job = PersonalizationJob(
+        The jobs are staged in batch_jobs under the workflow ID, and the workflow
+        pages through them, so its input stays small however many jobs there are.
+        """
+        jobs = validated_data['jobs']
+        
+        BatchJob.objects.bulk_create(
+            [
+                BatchJob(
+                    workflow_id=workflow_id,
+                    job_index=job_index,
                     company_info_id=job['company_info_id'],
                     target_account_id=job['target_account_id'],
-                    personalization_target=target
+                    target_type=job['personalization_target']['type'],
+                    target_text=job['personalization_target']['text']
                 )
-                
-                personalization_jobs.append(personalization_job)
+                for job_index, job in enumerate(jobs)
+            ],
+            batch_size=1000
+        )
+        
+        params = AdContentWorkflowParams(
+            job_count=len(jobs),
+            bypass_cache=validated_data['bypass_cache']
+        )
+        return params, f"{len(jobs)} jobs"
+    
+    async def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Validate request data using serializer
+        serializer = self.serializer_class(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        started = time.perf_counter()
+        
+        try:
+            # The suffix keeps IDs unique for submissions in the same second
+            workflow_id = f"ad-content-workflow-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+            
+            # The workflow resolves the worker's config snapshot, so no YAML is read here
+            params, description = await sync_to_async(self.build_params)(serializer.validated_data, workflow_id)
             
             # Start the workflow
-            workflow_id = f"ad-content-workflow-{int(time.time())}"
-            handle = await client.start_workflow(
+            await start_workflow(
                 "AdContentWorkflow",       # Workflow type name
-                personalization_jobs,      # Workflow arguments as PersonalizationJob objects
+                params,                    # Workflow arguments
                 id=workflow_id,            # Workflow ID
-                task_queue="ad-composer-task-queue"  # Task queue
+                task_queue=settings.TEMPORAL_TASK_QUEUE
             )
             
             logger.info(f"Started workflow with ID: {workflow_id}")
-            return workflow_id
-        
-        # Run the async function in the event loop
-        workflow_id = asyncio.run(start_workflow())
+            metrics.observe("batch_start.latency", time.perf_counter() - started)
+            
+            # Return the workflow ID
+            return JsonResponse({
+                "workflow_id": workflow_id,
+                "status": "started",
+                "message": f"Batch personalization workflow started with {description}"
+            })
         
-        # Return the workflow ID
-        return Response({
-            "workflow_id": workflow_id,
-            "status": "started",
-            "message": f"Batch personalization workflow started with {len(jobs)} jobs"
-        })
+        except Exception as e:
+            logger.error(f"Error starting batch personalization workflow: {e}")
+            # No workflow will page through the jobs staged for it
+            try:
+                await sync_to_async(BatchJob.objects.filter(workflow_id=workflow_id).delete)()
+            except Exception as cleanup_error:
+                logger.warning(f"Failed to delete staged jobs of {workflow_id}: {cleanup_error}")
+            return JsonResponse({
+                "error": "Failed to start batch personalization workflow",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class SegmentBatchPersonalizationView(BatchPersonalizationView):
+    """
+    POST endpoint to start a batch personalization workflow for a segment of accounts.
+    Takes company_info_id, an account selector (all accounts, an industry or a list
+    of account IDs) and the personalization targets; the workflow creates one job
+    per matching account and target, paging through the accounts itself.
+    """
+    serializer_class = SegmentBatchPersonalizationRequestSerializer
     
-    except Exception as e:
-        logger.error(f"Error starting batch personalization workflow: {e}")
-        return Response({
-            "error": "Failed to start batch personalization workflow",
-            "details": str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+    def build_params(self, validated_data, workflow_id):
+        selector = validated_data['selector']
+        targets = [
+            PersonalizationTarget(type=target['type'], text=target['text'])
+            for target in validated_data['personalization_targets']
+        ]
+        params = AdContentWorkflowParams(
+            segment=SegmentBatch(
+                company_info_id=validated_data['company_info_id'],
+                selector=AccountSelector(
+                    kind=selector['kind'],
+                    industry_id=selector.get('industry_id'),
+                    account_ids=selector.get('account_ids')
+                ),
+                targets=targets
+            ),
+            bypass_cache=validated_data['bypass_cache']
+        )
+        return params, f"{len(targets)} targets for {selector['kind']} accounts"
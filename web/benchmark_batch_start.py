@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/batch-personalize/ under concurrent submissions.
+
+Fires N concurrent POSTs at a running web app and reports start latency and the
+number of Temporal connections the web process opened (from /api/metrics).
+Run it against the server before and after a change to compare.
+
+Usage: python benchmark_batch_start.py --base-url http://localhost:8001 --requests 50
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def temporal_connects(base_url):
+    """Return the web process's Temporal connection count, if it reports one."""
+    try:
+        counters = requests.get(f"{base_url}/api/metrics", timeout=10).json().get("counters", {})
+        # Servers without the shared client don't report the counter at all
+        return counters.get("temporal_client.connects")
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def submit(base_url, payload):
+    started = time.perf_counter()
+    response = requests.post(f"{base_url}/api/batch-personalize/", json=payload, timeout=60)
+    return time.perf_counter() - started, response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent batch-start submissions")
+    parser.add_argument("--base-url", default="http://localhost:8001", help="Web app base URL")
+    parser.add_argument("--requests", type=int, default=50, help="Number of concurrent submissions")
+    parser.add_argument("--company-info-id", type=int, default=1)
+    parser.add_argument("--target-account-id", type=int, default=1)
+    args = parser.parse_args()
+
+    payload = {
+        "jobs": [{
+            "company_info_id": args.company_info_id,
+            "target_account_id": args.target_account_id,
+            "personalization_target": {"type": "benchmark", "text": "Benchmark text"}
+        }]
+    }
+
+    connects_before = temporal_connects(args.base_url)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as executor:
+        results = list(executor.map(lambda _: submit(args.base_url, payload), range(args.requests)))
+    wall_time = time.perf_counter() - started
+    connects_after = temporal_connects(args.base_url)
+
+    latencies = sorted(latency for latency, _ in results)
+    failures = sum(1 for _, status_code in results if status_code != 200)
+    print(f"Submissions:  {args.requests} ({failures} failed)")
+    print(f"Wall time:    {wall_time:.2f}s")
+    print(f"Latency p50:  {statistics.median(latencies) * 1000:.0f}ms")
+    print(f"Latency p95:  {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms")
+    print(f"Latency max:  {latencies[-1] * 1000:.0f}ms")
+    if connects_before is None or connects_after is None:
+        # Servers without the shared client open one connection per submission
+        print("Temporal connections: not reported (one per submission before the shared client)")
+    else:
+        print(f"Temporal connections opened: {connects_after - connects_before}")
+
+
+if __name__ == "__main__":
+    main()
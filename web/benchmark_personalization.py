@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark sequential, concurrent and batched personalization against a stubbed chat model.
+Run from the web/ directory: python benchmark_personalization.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
+
+from ad_composer.personalization import (
+    BATCH_RESPONSE_KEY,
+    build_batch_personalization_prompt,
+    build_personalization_prompt,
+    personalize_texts,
+    personalize_texts_batched
+)
+
+PROMPT_ARGS = ("Stampli", "AP automation software. " * 40, "Example Corp", "Example Corp context. " * 80)
+NUMBERED_TEXT = re.compile(r'^\s*\d+\. (".*")$', re.MULTILINE)
+
+
+class StubChatModel:
+    """Chat model stand-in that sleeps for a fixed latency per call and counts prompt tokens."""
+
+    def __init__(self, latency, json_mode=False, counters=None):
+        self.latency = latency
+        self.json_mode = json_mode
+        self.counters = counters if counters is not None else {"calls": 0, "tokens": 0}
+        self._lock = threading.Lock()
+
+    def bind(self, **kwargs):
+        return StubChatModel(self.latency, json_mode="response_format" in kwargs, counters=self.counters)
+
+    def get_num_tokens(self, text):
+        return len(text) // 4 + 1
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["tokens"] += self.get_num_tokens(prompt)
+        time.sleep(self.latency)
+        if self.json_mode:
+            texts = [json.loads(text) for text in NUMBERED_TEXT.findall(prompt)]
+            return SimpleNamespace(content=json.dumps({BATCH_RESPONSE_KEY: [f"personalized: {t}" for t in texts]}))
+        return SimpleNamespace(content="personalized")
+
+
+def run(latency, count, mode, max_concurrency, token_budget):
+    chat_model = StubChatModel(latency)
+    texts = [f"Marketing text number {i} for the landing page." for i in range(count)]
+    started = time.perf_counter()
+    if mode == "batched":
+        results = personalize_texts_batched(
+            chat_model,
+            texts,
+            build_prompt=partial(build_personalization_prompt, *PROMPT_ARGS),
+            build_batch_prompt=partial(build_batch_personalization_prompt, *PROMPT_ARGS),
+            token_budget=token_budget,
+            max_concurrency=max_concurrency
+        )
+    else:
+        prompts = [build_personalization_prompt(*PROMPT_ARGS, text) for text in texts]
+        results = personalize_texts(chat_model, prompts, max_concurrency=max_concurrency)
+    elapsed = time.perf_counter() - started
+    assert len(results) == count, "missing results"
+    return elapsed, chat_model.counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark personalization modes with a stubbed model")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per model call")
+    parser.add_argument("--concurrency", type=int, default=5, help="Concurrency cap for the concurrent modes")
+    parser.add_argument("--token-budget", type=int, default=3000, help="Token budget per batched call")
+    args = parser.parse_args()
+
+    print(f"Stub latency: {args.latency:.2f}s per call, concurrency cap: {args.concurrency}, "
+          f"token budget: {args.token_budget}")
+    print(f"{'texts':>6} {'mode':>11} {'latency':>9} {'calls':>6} {'prompt tokens':>14}")
+    for count in (1, 5, 20):
+        for mode, concurrency in (("sequential", 1), ("concurrent", args.concurrency), ("batched", args.concurrency)):
+            elapsed, counters = run(args.latency, count, mode, concurrency, args.token_budget)
+            print(f"{count:>6} {mode:>11} {elapsed:>8.2f}s {counters['calls']:>6} {counters['tokens']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Regression cases for the fetch_url URL rewriter.
+
+Each case is rewritten in one pass and again split into two chunks at every
+possible position, and both must give the expected output, so tags, quoted
+values, comments and script bodies cut by a chunk boundary are covered too.
+Run from the web/ directory: python check_url_rewriter.py
+"""
+import sys
+
+from ad_composer.url_rewriter import iter_rewritten_html, rewrite_html
+
+PAGE_URL = "https://ex.com/a/page.html"
+
+CASES = [
+    # URL attributes of start tags are rewritten, whatever the quoting
+    ('<img src="x.png">', '<img src="https://ex.com/a/x.png">'),
+    ("<a href='/b'>b</a>", "<a href='https://ex.com/b'>b</a>"),
+    ("<a HREF=c.html>c</a>", '<a HREF="https://ex.com/a/c.html">c</a>'),
+    ('<script src="//cdn.ex.com/lib.js"></script>', '<script src="https://cdn.ex.com/lib.js"></script>'),
+    ('<img srcset="a.png 1x, b.png 2x">', '<img srcset="https://ex.com/a/a.png 1x, https://ex.com/a/b.png 2x">'),
+    ('<a href="#top" data-x="1">t</a>', '<a href="#top" data-x="1">t</a>'),
+    # A '>' inside a quoted value doesn't end the tag
+    ('<a title="a > b" href="d">d</a>', '<a title="a > b" href="https://ex.com/a/d">d</a>'),
+    # Attribute-like text inside another attribute's value is left alone
+    ('<img alt="src=x" src="y.png">', '<img alt="src=x" src="https://ex.com/a/y.png">'),
+    # CSS url() in style attributes and style elements
+    ("<div style=\"background: url('bg.png')\"></div>", "<div style=\"background: url('https://ex.com/a/bg.png')\"></div>"),
+    ("<style>.a { background: url(/i.png) }</style>", "<style>.a { background: url(https://ex.com/i.png) }</style>"),
+    # Text, scripts and comments are not markup
+    ('<script>if (location.href == "foo") {}</script>', '<script>if (location.href == "foo") {}</script>'),
+    ("<script>img.src = cond ? a : b;</script>", "<script>img.src = cond ? a : b;</script>"),
+    ('<script>var s = "<a href=x>";</script>', '<script>var s = "<a href=x>";</script>'),
+    ("<p>use src=value</p>", "<p>use src=value</p>"),
+    ("<p>see url(x) here</p>", "<p>see url(x) here</p>"),
+    ('<!-- <a href="x"> -->', '<!-- <a href="x"> -->'),
+    ('<textarea><img src="x"></textarea>', '<textarea><img src="x"></textarea>'),
+    ("<p>1 < 2 and 3 > 2</p>", "<p>1 < 2 and 3 > 2</p>"),
+    # Markup after a raw text element is rewritten again
+    ('<script>x = 1</script><img src="z.png">', '<script>x = 1</script><img src="https://ex.com/a/z.png">'),
+]
+
+
+def check(html, expected):
+    failures = []
+    result = rewrite_html(html, PAGE_URL)
+    if result != expected:
+        failures.append(f"whole: {result!r}")
+    for cut in range(1, len(html)):
+        result = "".join(iter_rewritten_html([html[:cut], html[cut:]], PAGE_URL))
+        if result != expected:
+            failures.append(f"cut at {cut}: {result!r}")
+            break
+    return failures
+
+
+def main():
+    failed = 0
+    for html, expected in CASES:
+        failures = check(html, expected)
+        if failures:
+            failed += 1
+            print(f"FAIL {html!r}\n  expected {expected!r}")
+            for failure in failures:
+                print(f"  {failure}")
+    print(f"{len(CASES) - failed}/{len(CASES)} cases passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
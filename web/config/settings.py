@@ -32,6 +32,7 @@ ALLOWED_HOSTS = ['*']  # Allow all hosts in development
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # Makes runserver serve config.asgi so async views don't block a sync worker
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -70,6 +71,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 
 # Database
@@ -89,6 +91,26 @@ DATABASES = {
 # OpenAI API key
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 
+# Temporal server address
+TEMPORAL_HOST = os.environ.get('TEMPORAL_HOST', 'temporal:7233')
+# Must match task_queue in workflow/config/ad_content_workflow_config.yaml
+TEMPORAL_TASK_QUEUE = os.environ.get('TEMPORAL_TASK_QUEUE', 'ad-composer-task-queue')
+
+# Maximum number of concurrent model calls per /api/personalize request (1 = sequential)
+PERSONALIZATION_MAX_CONCURRENCY = int(os.environ.get('PERSONALIZATION_MAX_CONCURRENCY', '5'))
+
+# 'concurrent' makes one model call per text; 'batched' personalizes several texts per call
+PERSONALIZATION_MODE = os.environ.get('PERSONALIZATION_MODE', 'concurrent')
+
+# Maximum prompt plus expected output tokens for one batched personalization call
+PERSONALIZATION_BATCH_TOKEN_BUDGET = int(os.environ.get('PERSONALIZATION_BATCH_TOKEN_BUDGET', '3000'))
+
+# Seconds between checks of the company_info version; writes show up within this delay
+COMPANY_INFO_CACHE_CHECK_SECONDS = int(os.environ.get('COMPANY_INFO_CACHE_CHECK_SECONDS', '30'))
+
+# Age after which precomputed personalization variants are regenerated in the background
+PRECOMPUTED_VARIANT_TTL_SECONDS = int(os.environ.get('PRECOMPUTED_VARIANT_TTL_SECONDS', '604800'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -2,22 +2,57 @@
 """
 Temporal workflow for generating personalized ad content for multiple targets.
 Main workflow spawns child workflows for each personalization job that execute in parallel.
+
+At most max_children_in_flight children run at once, and results are collected
+as they complete. Each run handles continue_as_new_after jobs and then continues
+as new with compact progress counters, so the event history of every run stays
+bounded however large the batch is.
+
+Job lists are staged in the batch_jobs table under the workflow ID by the
+starter; each run pages through its share with an activity and carries only
+the index of the next job forward, so no run's input grows with the batch.
+
+Segment batches name their accounts with a selector instead of listing jobs;
+each run pages through the matching account IDs with an activity and carries
+only the last account ID forward.
+
+The workflow answers a `progress` query and pushes the same progress (with an
+ETA when the total is known) to the notification service at most once per
+progress_push_interval seconds.
 """
 import asyncio
 import logging
 from datetime import timedelta
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 
 from temporalio import workflow
 from temporalio.common import RetryPolicy
 from temporalio.exceptions import ApplicationError
 from temporalio.workflow import unsafe
 
-from workflow.common_activities import load_config_activity
-
 with unsafe.imports_passed_through():
+    from workflow.common_activities import (
+        load_config_snapshot_activity,
+        push_workflow_progress_activity,
+        WorkflowProgressEvent
+    )
+    from workflow.config import ConfigSnapshot
     from workflow.target_workflow import TargetWorkflow, PersonalizationTarget, TargetWorkflowParams
+    from workflow.target_activities import (
+        get_company_infos_activity,
+        get_target_accounts_activity,
+        get_contextual_information_activity,
+        get_account_ids_page_activity,
+        get_batch_jobs_page_activity,
+        delete_batch_jobs_activity,
+        save_personalized_content_batch_activity,
+        AccountIdsPageInput,
+        AccountSelector,
+        BatchJobsPageInput,
+        DeleteBatchJobsInput,
+        SaveContentInput
+    )
 
 logger = logging.getLogger(__name__)
 
@@ -29,34 +64,151 @@ class PersonalizationJob:
     target_account_id: int
     personalization_target: PersonalizationTarget
 
+@dataclass
+class SegmentBatch:
+    """Personalization targets for every account matching a selector, expanded by the workflow."""
+    company_info_id: int
+    selector: AccountSelector
+    targets: List[PersonalizationTarget]
+    after_account_id: int = 0  # accounts up to this ID were handled by earlier runs
+
+@dataclass
+class BatchProgress:
+    """Progress of a batch, carried across continue-as-new runs."""
+    completed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    saved: int = 0
+    runs: int = 1
+    started_at: Optional[float] = None  # epoch seconds when the first run started
+    # The first max_recorded_failures failures; later ones are only counted
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+
+@dataclass
+class AdContentWorkflowParams:
+    """Parameters for the AdContentWorkflow."""
+    # Number of jobs staged in batch_jobs under the workflow ID, with job indexes 0 to job_count - 1
+    job_count: int = 0
+    # Alternative to staged jobs: one job per matching account and target
+    segment: Optional[SegmentBatch] = None
+    # Config snapshot resolved by the starter; loaded with an activity when missing
+    config: Optional[ConfigSnapshot] = None
+    bypass_cache: bool = False  # Regenerate even if cached responses exist
+    # Set when continuing as new: index of the run's first job in the whole batch, and the progress so far
+    offset: int = 0
+    progress: Optional[BatchProgress] = None
+
 @workflow.defn
 class AdContentWorkflow:
     """Main workflow to generate personalized ad content for multiple jobs in parallel."""
 
+    def __init__(self) -> None:
+        self._status = "starting"
+        self._progress = BatchProgress()
+        self._total: Optional[int] = None  # unknown for segment batches
+        self._in_flight = 0
+        self._config_version: Optional[str] = None
+        self._push = None
+        self._last_push_at = None
+
+    @workflow.query
+    def progress(self) -> Dict[str, Any]:
+        """Current progress of the whole batch, across continue-as-new runs."""
+        progress = self._progress
+        elapsed = workflow.now().timestamp() - progress.started_at if progress.started_at else 0.0
+        eta_seconds = None
+        if self._total is not None and progress.completed and elapsed > 0:
+            eta_seconds = round((self._total - progress.completed) * elapsed / progress.completed, 1)
+        return {
+            "status": self._status,
+            "total": self._total,
+            "completed": progress.completed,
+            "succeeded": progress.succeeded,
+            "failed": progress.failed,
+            "saved": progress.saved,
+            "in_flight": self._in_flight,
+            "run": progress.runs,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta_seconds,
+            "config_version": self._config_version
+        }
+
+    def _push_progress(self, interval_seconds: float, force: bool = False) -> None:
+        """
+        Push the current progress to the notification service, unless a push is
+        still running or the last one was less than interval_seconds ago.
+        """
+        if interval_seconds <= 0:
+            return
+        now = workflow.now()
+        if not force:
+            if self._push is not None and not self._push.done():
+                return
+            if self._last_push_at and (now - self._last_push_at).total_seconds() < interval_seconds:
+                return
+        self._last_push_at = now
+        self._push = workflow.start_activity(
+            push_workflow_progress_activity,
+            WorkflowProgressEvent(
+                workflow_id=workflow.info().workflow_id,
+                status=self._status,
+                details=self.progress()
+            ),
+            start_to_close_timeout=timedelta(seconds=10),
+            # Progress is superseded by the next push, so a failed one isn't retried
+            retry_policy=RetryPolicy(maximum_attempts=1)
+        )
+
+    async def _wait_for_push(self) -> None:
+        if self._push is not None:
+            try:
+                await self._push
+            except Exception as e:
+                workflow.logger.warning(f"Failed to push workflow progress: {str(e)}")
+
     @workflow.run
-    async def run(self, personalization_jobs: List[PersonalizationJob]) -> Dict[str, Any]:
+    async def run(self, params: AdContentWorkflowParams) -> Dict[str, Any]:
         """
         Run the ad content generation workflow for multiple personalization jobs in parallel.
         
         Args:
-            personalization_jobs: List of PersonalizationJob objects, each containing:
-                - company_info_id: ID of the company info to use
-                - target_account_id: ID of the target account
-                - personalization_target: PersonalizationTarget with type and text
+            params: AdContentWorkflowParams containing:
+                - job_count: Number of jobs staged in batch_jobs under the workflow ID, each with:
+                    - company_info_id: ID of the company info to use
+                    - target_account_id: ID of the target account
+                    - target_type, target_text: the personalization target
+                - segment: Optional SegmentBatch expanded into jobs instead of staged jobs
+                - config: ConfigSnapshot carried over by continue-as-new (the first run loads the worker's)
+                - bypass_cache: Skip the LLM response cache for every job
+                - offset, progress: Position and progress carried over by continue-as-new
             
         Returns:
-            Dictionary with results for each personalization job
+            Dictionary with the batch's job counts and its first failures
         """
-        # Load configuration
-        config = await workflow.execute_activity(
-            load_config_activity,
-            "ad_content_workflow_config.yaml",
-            start_to_close_timeout=timedelta(seconds=5)
-        )
+        # Load the worker's config snapshot once per batch; continued runs and children get it as input
+        config_snapshot = params.config
+        if config_snapshot is None:
+            config_snapshot = await workflow.execute_activity(
+                load_config_snapshot_activity,
+                start_to_close_timeout=timedelta(seconds=5)
+            )
+        config = config_snapshot.ad_content
+        self._config_version = config_snapshot.version
+        workflow.logger.info(f"Using config version {config_snapshot.version}")
         
         # Get configuration values
         task_queue = config.get("task_queue", "ad-composer-task-queue")
         timeout_seconds = config.get("timeouts", {}).get("workflow_execution", 1800)
+        save_timeout_seconds = config.get("timeouts", {}).get("save_batch", 120)
+        save_batch_size = config.get("save_batch_size", 500)
+        prefetch_timeout_seconds = config.get("timeouts", {}).get("prefetch", 300)
+        prefetch_concurrency = config.get("prefetch_concurrency", 20)
+        max_children_in_flight = config.get("max_children_in_flight", 50)
+        continue_as_new_after = config.get("continue_as_new_after", 1000)
+        max_recorded_failures = config.get("max_recorded_failures", 100)
+        account_page_size = config.get("account_page_size", 1000)
+        job_page_size = config.get("job_page_size", 200)
+        push_interval = config.get("progress_push_interval", 5)
         retry_policy_config = config.get("retry_policy", {})
         
         # Create retry policy from config
@@ -68,59 +220,311 @@ class AdContentWorkflow:
             non_retryable_error_types=retry_policy_config.get("non_retryable_error_types", [])
         )
         
-        workflow.logger.info(f"Starting ad content workflow for {len(personalization_jobs)} jobs")
+        # This run handles the first continue_as_new_after jobs; the rest go to the next run
+        progress = self._progress = params.progress or BatchProgress(started_at=workflow.now().timestamp())
+        if not params.segment:
+            self._total = params.job_count
+        self._status = "started" if progress.runs == 1 else "in_progress"
+        self._push_progress(push_interval, force=True)
+        self._status = "in_progress"
+        next_segment = None
+        if params.segment:
+            personalization_jobs, next_segment = await self._expand_segment(
+                params.segment,
+                max_jobs=continue_as_new_after,
+                page_size=account_page_size,
+                retry_policy=retry_policy,
+                timeout=timedelta(seconds=prefetch_timeout_seconds)
+            )
+            remaining_jobs = 0
+        else:
+            run_jobs = min(continue_as_new_after, params.job_count - params.offset)
+            personalization_jobs = await self._load_staged_jobs(
+                params.offset,
+                max_jobs=run_jobs,
+                page_size=job_page_size,
+                retry_policy=retry_policy,
+                timeout=timedelta(seconds=prefetch_timeout_seconds)
+            )
+            remaining_jobs = params.job_count - params.offset - run_jobs
+            if len(personalization_jobs) < run_jobs:
+                # Staged jobs are deleted once handled, so missing ones mean the batch was already run or cleaned up
+                workflow.logger.warning(
+                    f"Found {len(personalization_jobs)} of {run_jobs} staged jobs from index {params.offset}; "
+                    "not continuing past them"
+                )
+                remaining_jobs = 0
+        workflow.logger.info(
+            f"Starting ad content workflow run {progress.runs} for {len(personalization_jobs)} jobs "
+            f"({remaining_jobs} more after this run)"
+        )
+        
+        # Fetch each distinct company info and target account once, and each
+        # distinct account website's context once, then hand them to the children
+        company_info_ids = sorted({job.company_info_id for job in personalization_jobs})
+        target_account_ids = sorted({job.target_account_id for job in personalization_jobs})
         
-        # Create tasks for each personalization job to run in parallel
-        child_workflow_tasks = []
-        job_identifiers = []
+        company_infos = await workflow.execute_activity(
+            get_company_infos_activity,
+            company_info_ids,
+            retry_policy=retry_policy,
+            start_to_close_timeout=timedelta(seconds=prefetch_timeout_seconds)
+        )
+        company_infos_by_id = {row["id"]: row for row in company_infos}
+        
+        target_accounts = await workflow.execute_activity(
+            get_target_accounts_activity,
+            target_account_ids,
+            retry_policy=retry_policy,
+            start_to_close_timeout=timedelta(seconds=prefetch_timeout_seconds)
+        )
+        target_accounts_by_id = {row["id"]: row for row in target_accounts}
         
-        for job in personalization_jobs:
+        urls = sorted({row["url"] for row in target_accounts if row.get("url")})
+        contexts_by_url = {}
+        for start in range(0, len(urls), prefetch_concurrency):
+            url_chunk = urls[start:start + prefetch_concurrency]
+            contexts = await asyncio.gather(*[
+                workflow.execute_activity(
+                    get_contextual_information_activity,
+                    url,
+                    retry_policy=retry_policy,
+                    start_to_close_timeout=timedelta(seconds=prefetch_timeout_seconds * 2)  # Longer timeout for web scraping
+                )
+                for url in url_chunk
+            ], return_exceptions=True)
+            for url, context in zip(url_chunk, contexts):
+                # Children whose context failed to prefetch fetch it themselves
+                if isinstance(context, BaseException):
+                    workflow.logger.warning(f"Failed to prefetch context for {url}: {str(context)}")
+                else:
+                    contexts_by_url[url] = context
+        
+        workflow.logger.info(
+            f"Prefetched {len(company_infos_by_id)} company infos, {len(target_accounts_by_id)} target accounts "
+            f"and {len(contexts_by_url)} website contexts"
+        )
+        
+        async def run_child(job_index, job):
+            """Run one job's child workflow; returns its result, or an error result if it failed."""
             company_info_id = job.company_info_id
             target_account_id = job.target_account_id
-            personalization_target = job.personalization_target
-            
             job_identifier = f"company-{company_info_id}-target-{target_account_id}"
-            job_identifiers.append(job_identifier)
             
-            workflow.logger.info(f"Creating child workflow for job: {job_identifier}")
+            # Results are saved here in bulk, keyed by workflow ID and the job's
+            # index in the whole batch so that retries never insert the same job twice
+            target_account = target_accounts_by_id.get(target_account_id)
+            target_context = None
+            if target_account:
+                target_context = contexts_by_url.get(target_account["url"]) if target_account.get("url") else ""
             
-            # Start child workflow for this job
-            # Create a params object instead of using args list
             workflow_params = TargetWorkflowParams(
                 company_info_id=company_info_id,
                 target_account_id=target_account_id,
-                personalization_target=personalization_target
+                personalization_target=job.personalization_target,
+                job_key=f"{workflow.info().workflow_id}:{job_index}",
+                defer_save=True,
+                company_info=company_infos_by_id.get(company_info_id),
+                target_account=target_account,
+                target_context=target_context,
+                config=config_snapshot.target,
+                config_version=config_snapshot.version,
+                bypass_cache=params.bypass_cache
             )
             
-            child_handle = await workflow.start_child_workflow(
-                TargetWorkflow,
-                id=f"target-workflow-{job_identifier}-{workflow.info().workflow_id}",
-                task_queue=task_queue,
-                retry_policy=retry_policy,
-                execution_timeout=timedelta(seconds=timeout_seconds),
-                arg=workflow_params
-            )
-            
-            # Add to list of tasks
-            child_workflow_tasks.append(child_handle)
-        
-        # Wait for all child workflows to complete
-        workflow.logger.info(f"Waiting for {len(child_workflow_tasks)} child workflows to complete")
-        results = {}
-        
-        # Gather results from all child workflows
-        for i, task in enumerate(child_workflow_tasks):
-            job_identifier = job_identifiers[i]
             try:
-                result = await task
-                results[job_identifier] = result
-                workflow.logger.info(f"Child workflow for {job_identifier} completed successfully")
+                return await workflow.execute_child_workflow(
+                    TargetWorkflow,
+                    id=f"target-workflow-{job_identifier}-job-{job_index}-{workflow.info().workflow_id}",
+                    task_queue=task_queue,
+                    retry_policy=retry_policy,
+                    execution_timeout=timedelta(seconds=timeout_seconds),
+                    memo={"config_version": config_snapshot.version},
+                    arg=workflow_params
+                )
             except Exception as e:
                 workflow.logger.error(f"Child workflow for {job_identifier} failed: {str(e)}")
-                results[job_identifier] = {
+                return {
+                    "company_info_id": company_info_id,
+                    "target_account_id": target_account_id,
                     "error": str(e),
                     "success": False
                 }
         
-        workflow.logger.info(f"Completed ad content workflow for all jobs")
-        return results
\ No newline at end of file
+        pending_saves = []
+        
+        async def flush_saves():
+            """Write buffered results with one bulk save activity."""
+            await workflow.execute_activity(
+                save_personalized_content_batch_activity,
+                list(pending_saves),
+                retry_policy=retry_policy,
+                start_to_close_timeout=timedelta(seconds=save_timeout_seconds)
+            )
+            progress.saved += len(pending_saves)
+            pending_saves.clear()
+        
+        # Keep at most max_children_in_flight children running, starting the next
+        # job as soon as any child completes
+        in_flight = {}
+        next_job = 0
+        while next_job < len(personalization_jobs) or in_flight:
+            while next_job < len(personalization_jobs) and len(in_flight) < max_children_in_flight:
+                job_index = params.offset + next_job
+                task = asyncio.ensure_future(run_child(job_index, personalization_jobs[next_job]))
+                in_flight[task] = job_index
+                next_job += 1
+            self._in_flight = len(in_flight)
+            
+            # wait_condition rather than asyncio.wait, whose set-based bookkeeping isn't replay-safe
+            await workflow.wait_condition(lambda: any(task.done() for task in in_flight))
+            
+            # Handle completed children in job order so replays make the same decisions
+            completed = sorted((job_index, task) for task, job_index in in_flight.items() if task.done())
+            for job_index, task in completed:
+                del in_flight[task]
+                result = task.result()
+                progress.completed += 1
+                if not result.get("success"):
+                    progress.failed += 1
+                    if len(progress.failures) < max_recorded_failures:
+                        progress.failures.append({
+                            "job_index": job_index,
+                            "company_info_id": result.get("company_info_id"),
+                            "target_account_id": result.get("target_account_id"),
+                            "error": result.get("error")
+                        })
+                    continue
+                
+                # Buffer successful results and save them in bulk
+                progress.succeeded += 1
+                pending_saves.append(SaveContentInput(
+                    company_info_id=result["company_info"]["id"],
+                    target_account_id=result["target_account"]["id"],
+                    original_text=result["original_text"],
+                    personalized_text=result["personalized_text"],
+                    text_type=result["text_type"],
+                    job_key=f"{workflow.info().workflow_id}:{job_index}"
+                ))
+                if len(pending_saves) >= save_batch_size:
+                    await flush_saves()
+            
+            self._in_flight = len(in_flight)
+            self._push_progress(push_interval)
+        
+        if pending_saves:
+            await flush_saves()
+        
+        # The staged jobs of this run are handled, so the table only holds the rest
+        if not params.segment:
+            await workflow.execute_activity(
+                delete_batch_jobs_activity,
+                DeleteBatchJobsInput(
+                    workflow_id=workflow.info().workflow_id,
+                    before_index=params.offset + len(personalization_jobs)
+                ),
+                retry_policy=retry_policy,
+                start_to_close_timeout=timedelta(seconds=save_timeout_seconds)
+            )
+        
+        # Every child of this run has completed, so nothing is left behind when continuing as new
+        await self._wait_for_push()
+        if remaining_jobs or next_segment:
+            workflow.logger.info(
+                f"Continuing as new after {progress.completed} jobs"
+                + (f", {remaining_jobs} remaining" if remaining_jobs else "")
+            )
+            workflow.continue_as_new(AdContentWorkflowParams(
+                job_count=params.job_count,
+                segment=next_segment,
+                config=config_snapshot,
+                bypass_cache=params.bypass_cache,
+                offset=params.offset + len(personalization_jobs),
+                progress=replace(progress, runs=progress.runs + 1)
+            ))
+        
+        workflow.logger.info(
+            f"Completed ad content workflow: {progress.succeeded} succeeded, {progress.failed} failed"
+        )
+        self._status = "completed"
+        self._push_progress(push_interval, force=True)
+        await self._wait_for_push()
+        return {
+            "total": progress.completed,
+            "succeeded": progress.succeeded,
+            "failed": progress.failed,
+            "saved": progress.saved,
+            "runs": progress.runs,
+            "config_version": config_snapshot.version,
+            "failures": progress.failures
+        }
+    
+    async def _load_staged_jobs(self, offset, max_jobs, page_size, retry_policy, timeout):
+        """
+        Load the next max_jobs jobs staged for this workflow, starting at job index offset.
+        
+        Returns:
+            The jobs in job index order; fewer than max_jobs only if rows are missing
+        """
+        jobs = []
+        while len(jobs) < max_jobs:
+            limit = min(page_size, max_jobs - len(jobs))
+            page = await workflow.execute_activity(
+                get_batch_jobs_page_activity,
+                BatchJobsPageInput(
+                    workflow_id=workflow.info().workflow_id,
+                    from_index=offset + len(jobs),
+                    limit=limit
+                ),
+                retry_policy=retry_policy,
+                start_to_close_timeout=timeout
+            )
+            jobs.extend(
+                PersonalizationJob(
+                    company_info_id=row["company_info_id"],
+                    target_account_id=row["target_account_id"],
+                    personalization_target=PersonalizationTarget(type=row["target_type"], text=row["target_text"])
+                )
+                for row in page
+            )
+            if len(page) < limit:
+                break
+        return jobs
+    
+    async def _expand_segment(self, segment, max_jobs, page_size, retry_policy, timeout):
+        """
+        Expand the next accounts of a segment batch into jobs.
+        
+        Returns:
+            Tuple of up to max_jobs jobs (whole accounts, at least one) and the
+            segment to continue with, or None when no accounts are left
+        """
+        max_accounts = max(1, max_jobs // len(segment.targets))
+        account_ids = []
+        after_id = segment.after_account_id
+        exhausted = False
+        while len(account_ids) < max_accounts:
+            limit = min(page_size, max_accounts - len(account_ids))
+            page = await workflow.execute_activity(
+                get_account_ids_page_activity,
+                AccountIdsPageInput(selector=segment.selector, after_id=after_id, limit=limit),
+                retry_policy=retry_policy,
+                start_to_close_timeout=timeout
+            )
+            account_ids.extend(page)
+            if len(page) < limit:
+                exhausted = True
+                break
+            after_id = page[-1]
+        
+        jobs = [
+            PersonalizationJob(
+                company_info_id=segment.company_info_id,
+                target_account_id=account_id,
+                personalization_target=target
+            )
+            for account_id in account_ids
+            for target in segment.targets
+        ]
+        next_segment = None if exhausted else replace(segment, after_account_id=account_ids[-1])
+        return jobs, next_segment
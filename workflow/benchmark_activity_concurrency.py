@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Throughput test for activities that call blocking code.
+
+Runs N concurrent activities that each block for a fixed time, once as
+`async def` activities on the worker's event loop (how the target activities
+used to be declared) and once as sync activities on a thread-pool executor
+(how they are registered now), and reports the wall time of each.
+
+Starts a local Temporal dev server, so it needs network access the first time.
+Usage: python -m workflow.benchmark_activity_concurrency --activities 10 --seconds 1
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from temporalio import activity, workflow
+from temporalio.testing import WorkflowEnvironment
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+
+TASK_QUEUE = "activity-concurrency-benchmark"
+
+
+@dataclass
+class FanOutParams:
+    """Parameters for FanOutWorkflow."""
+    activity_name: str
+    count: int
+    seconds: float
+
+
+@activity.defn
+async def blocking_async_activity(seconds: float) -> None:
+    """Blocking call inside a coroutine: stalls the worker's event loop."""
+    time.sleep(seconds)
+
+
+@activity.defn
+def blocking_sync_activity(seconds: float) -> None:
+    """Blocking call in a sync activity: runs on the activity thread pool."""
+    time.sleep(seconds)
+
+
+@workflow.defn
+class FanOutWorkflow:
+    """Runs the requested activity count times concurrently."""
+
+    @workflow.run
+    async def run(self, params: FanOutParams) -> None:
+        await asyncio.gather(*[
+            workflow.execute_activity(
+                params.activity_name,
+                params.seconds,
+                start_to_close_timeout=timedelta(seconds=params.seconds * params.count + 30)
+            )
+            for _ in range(params.count)
+        ])
+
+
+async def run_fan_out(client, activity_name, count, seconds):
+    started = time.perf_counter()
+    await client.execute_workflow(
+        FanOutWorkflow.run,
+        FanOutParams(activity_name=activity_name, count=count, seconds=seconds),
+        id=f"activity-concurrency-{uuid.uuid4()}",
+        task_queue=TASK_QUEUE
+    )
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare blocking async activities with sync activities")
+    parser.add_argument("--activities", type=int, default=10, help="Concurrent activities per run")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Blocking time per activity")
+    args = parser.parse_args()
+
+    async with await WorkflowEnvironment.start_local() as env:
+        with ThreadPoolExecutor(max_workers=args.activities) as executor:
+            async with Worker(
+                env.client,
+                task_queue=TASK_QUEUE,
+                workflows=[FanOutWorkflow],
+                activities=[blocking_async_activity, blocking_sync_activity],
+                activity_executor=executor,
+                max_concurrent_activities=args.activities,
+                workflow_runner=UnsandboxedWorkflowRunner()
+            ):
+                print(f"{args.activities} activities blocking {args.seconds:.1f}s each "
+                      f"(ideal parallel time {args.seconds:.1f}s)")
+                for activity_name in ("blocking_async_activity", "blocking_sync_activity"):
+                    elapsed = await run_fan_out(env.client, activity_name, args.activities, args.seconds)
+                    print(f"{activity_name:>24}: {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
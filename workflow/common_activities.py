@@ -4,15 +4,39 @@ Common activities used by multiple workflows.
 """
 import os
 import yaml
+from dataclasses import dataclass
 from typing import Dict, Any
 
 from temporalio import activity
 
+from workflow.config import ConfigSnapshot, get_config_snapshot
+from workflow.notifications import notification_client
+
+@dataclass
+class WorkflowProgressEvent:
+    """Input parameters for push_workflow_progress_activity."""
+    workflow_id: str
+    status: str  # "started", "in_progress" or "completed"
+    details: Dict[str, Any]
+
 @activity.defn
-async def load_config_activity(config_file: str) -> Dict[str, Any]:
+def load_config_activity(config_file: str) -> Dict[str, Any]:
     """Load configuration from a YAML file."""
     config_path = os.path.join(os.path.dirname(__file__), "config", config_file)
     with open(config_path, "r") as f:
         config = yaml.safe_load(f)
     
-    return config
\ No newline at end of file
+    return config
+
+@activity.defn
+def load_config_snapshot_activity() -> ConfigSnapshot:
+    """Return the worker's current config snapshot."""
+    return get_config_snapshot()
+
+@activity.defn
+async def push_workflow_progress_activity(event: WorkflowProgressEvent) -> bool:
+    """
+    Push a workflow's progress to the clients subscribed to it on the notification service.
+    Runs on the worker's event loop and shares its pooled HTTP session; never raises.
+    """
+    return await notification_client.send_workflow_notification(event.workflow_id, event.status, event.details)
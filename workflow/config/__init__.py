@@ -1 +1,65 @@
-# Package initialization
\ No newline at end of file
+"""
+Versioned snapshot of the workflow YAML configuration.
+
+The snapshot is loaded once per process and reloaded only when one of the
+files' modification time changes. Batch workflows fetch the worker's snapshot
+with one activity and pass it to their children and continued runs as input,
+so child runs don't need a config activity and activities don't re-read the
+files on every call.
+"""
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import yaml
+
+CONFIG_DIR = os.path.dirname(__file__)
+AD_CONTENT_CONFIG_FILE = "ad_content_workflow_config.yaml"
+TARGET_CONFIG_FILE = "target_workflow_config.yaml"
+
+
+@dataclass
+class ConfigSnapshot:
+    """Resolved workflow configuration with a content-derived version."""
+    version: str
+    ad_content: Dict[str, Any]
+    target: Dict[str, Any]
+
+
+_lock = threading.Lock()
+_snapshot = None
+_mtimes = None
+
+
+def _config_mtimes():
+    return tuple(
+        os.stat(os.path.join(CONFIG_DIR, name)).st_mtime_ns
+        for name in (AD_CONTENT_CONFIG_FILE, TARGET_CONFIG_FILE)
+    )
+
+
+def _load_snapshot() -> ConfigSnapshot:
+    digest = hashlib.sha256()
+    sections = []
+    for name in (AD_CONTENT_CONFIG_FILE, TARGET_CONFIG_FILE):
+        with open(os.path.join(CONFIG_DIR, name), "rb") as f:
+            content = f.read()
+        digest.update(content)
+        sections.append(yaml.safe_load(content) or {})
+    return ConfigSnapshot(version=digest.hexdigest()[:12], ad_content=sections[0], target=sections[1])
+
+
+def get_config_snapshot() -> ConfigSnapshot:
+    """Return the current config snapshot, reloading it if a config file changed."""
+    global _snapshot, _mtimes
+    mtimes = _config_mtimes()
+    if _snapshot is not None and mtimes == _mtimes:
+        return _snapshot
+
+    with _lock:
+        if _snapshot is None or mtimes != _mtimes:
+            _snapshot = _load_snapshot()
+            _mtimes = mtimes
+        return _snapshot
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Postgres-backed cache of extracted target-account context.
+
+Entries are keyed by normalized account URL and shared by the web app and the
+worker. Fresh entries are served directly; entries within the stale window are
+served immediately while a background refresh runs; older entries are
+revalidated with a conditional request (ETag / Last-Modified) through the
+shared page fetcher before the page is processed again.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+import requests
+
+from workflow.db import connection
+from workflow.metrics import metrics
+from workflow.page_fetch import normalize_url, page_fetcher
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ContextCacheEntry:
+    """A cached context row."""
+    context: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: datetime
+
+
+class ContextCache:
+    """Shared cache of extracted account context with TTL and stale-while-revalidate."""
+
+    def __init__(self, ttl_seconds: int, stale_seconds: int, connection_factory=connection):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._connection = connection_factory
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-refresh")
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+
+    def get(self, url: str, extract: Callable[[str], str]) -> str:
+        """
+        Return the context for url, calling extract(url) only when the cache
+        cannot serve it.
+        """
+        key = normalize_url(url)
+        entry = self._load(key)
+
+        if entry:
+            age = time.time() - entry.fetched_at.timestamp()
+            if age < self.ttl_seconds:
+                self._record_hit(key, "hit")
+                return entry.context
+
+            if age < self.ttl_seconds + self.stale_seconds:
+                self._record_hit(key, "stale_hit")
+                self._schedule_refresh(key, url, entry, extract)
+                return entry.context
+
+            if self._not_modified(url, entry):
+                self._touch(key)
+                self._record_hit(key, "revalidated")
+                return entry.context
+
+        metrics.incr("context_cache.miss")
+        return self._refresh(key, url, extract)
+
+    def _refresh(self, key: str, url: str, extract: Callable[[str], str]) -> str:
+        """Extract the context from scratch and store it."""
+        etag, last_modified = self._fetch_validators(url)
+        started = time.perf_counter()
+        context = extract(url)
+        metrics.observe("context_cache.extract", time.perf_counter() - started)
+
+        # Failed extractions return an empty string; don't cache them
+        if context:
+            self._store(key, url, context, etag, last_modified)
+        return context
+
+    def _schedule_refresh(self, key: str, url: str, entry: ContextCacheEntry, extract: Callable[[str], str]) -> None:
+        """Revalidate or re-extract an entry in the background, once per key."""
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                if self._not_modified(url, entry):
+                    self._touch(key)
+                    metrics.incr("context_cache.revalidated")
+                else:
+                    self._refresh(key, url, extract)
+            except Exception as e:
+                logger.error(f"Background context refresh failed for {key}: {str(e)}")
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+
+        self._refresh_executor.submit(refresh)
+
+    def _not_modified(self, url: str, entry: ContextCacheEntry) -> bool:
+        """
+        Revalidate the page through the shared page fetcher and report whether it
+        still has the validators the context was extracted from. A changed page is
+        left in the page cache for the extraction that follows.
+        """
+        if not entry.etag and not entry.last_modified:
+            return False
+
+        try:
+            page = page_fetcher.fetch(url, max_age=0)
+        except requests.RequestException as e:
+            logger.warning(f"Context revalidation failed for {url}: {str(e)}")
+            return False
+        if entry.etag:
+            return page.etag == entry.etag
+        return page.last_modified == entry.last_modified
+
+    def _fetch_validators(self, url: str):
+        """
+        Fetch the page's ETag and Last-Modified validators, if the server provides
+        them. This also warms the page cache that the extraction reads from.
+        """
+        try:
+            page = page_fetcher.fetch(url)
+            return page.etag, page.last_modified
+        except requests.RequestException:
+            return None, None
+
+    def _record_hit(self, key: str, kind: str) -> None:
+        metrics.incr(f"context_cache.{kind}")
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE target_context_cache SET hit_count = hit_count + 1 WHERE url_key = %s",
+                        (key,)
+                    )
+        except Exception as e:
+            logger.warning(f"Error recording context cache hit: {str(e)}")
+
+    def _load(self, key: str) -> Optional[ContextCacheEntry]:
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT context, etag, last_modified, fetched_at
+                        FROM target_context_cache
+                        WHERE url_key = %s
+                        """,
+                        (key,)
+                    )
+                    row = cursor.fetchone()
+                    return ContextCacheEntry(*row) if row else None
+        except Exception as e:
+            logger.warning(f"Error reading context cache: {str(e)}")
+            return None
+
+    def _store(self, key: str, url: str, context: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        INSERT INTO target_context_cache
+                        (url_key, url, context, etag, last_modified, fetched_at)
+                        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                        ON CONFLICT (url_key) DO UPDATE SET
+                            url = EXCLUDED.url,
+                            context = EXCLUDED.context,
+                            etag = EXCLUDED.etag,
+                            last_modified = EXCLUDED.last_modified,
+                            fetched_at = EXCLUDED.fetched_at,
+                            updated_at = CURRENT_TIMESTAMP
+                        """,
+                        (key, url, context, etag, last_modified)
+                    )
+        except Exception as e:
+            logger.warning(f"Error writing context cache: {str(e)}")
+
+    def _touch(self, key: str) -> None:
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE target_context_cache SET fetched_at = CURRENT_TIMESTAMP WHERE url_key = %s",
+                        (key,)
+                    )
+        except Exception as e:
+            logger.warning(f"Error refreshing context cache entry: {str(e)}")
+
+
+# Shared instance; TTL and stale window are configured through the environment
+# so the web app and the worker agree on freshness.
+context_cache = ContextCache(
+    ttl_seconds=int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", "86400")),
+    stale_seconds=int(os.environ.get("CONTEXT_CACHE_STALE_SECONDS", "604800"))
+)
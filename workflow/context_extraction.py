@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Extraction of contextual information from a target account's website.
+Used by both the web app and the worker activities.
+
+The strategy depends on the page's token count: small pages are summarized
+with a single call, mid-size pages go through retrieval over a per-account
+vector index, and large pages are summarized with a parallel map-reduce.
+Thresholds are read from the `context_extraction` section of
+target_workflow_config.yaml.
+"""
+import logging
+import os
+import time
+
+from bs4 import BeautifulSoup
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.chains import RetrievalQA
+from langchain_core.documents import Document
+
+from workflow.config import get_config_snapshot
+from workflow.embedding_cache import get_cached_embeddings
+from workflow.metrics import metrics
+from workflow.openai_models import RateLimitedChatOpenAI
+from workflow.page_fetch import page_fetcher
+from workflow.vector_index import vector_index
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_QUERY = "Extract the key messaging, brand positioning, and main pain points of this company"
+
+MAP_PROMPT = (
+    "The following is one section of a company's website. Summarize the company's key messaging, "
+    "brand positioning, and main pain points that appear in it.\n\n{text}"
+)
+
+REDUCE_PROMPT = (
+    "The following are summaries of the sections of a company's website. "
+    f"{CONTEXT_QUERY}.\n\n{{text}}"
+)
+
+
+def _summarize(chat_model, text: str) -> str:
+    """Single summarization call for pages that fit in one prompt."""
+    return chat_model.invoke(f"{CONTEXT_QUERY}.\n\n{text}").content
+
+
+def _retrieve(chat_model, url: str, documents) -> str:
+    """Split, embed and query the account's vector index."""
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    texts = text_splitter.split_documents(documents)
+    logger.info(f"Number of text chunks: {len(texts)}")
+
+    # Create embeddings and vector store; unchanged chunks are served from the embedding cache
+    embeddings = get_cached_embeddings()
+
+    # Replace this account's collection and query only its chunks
+    with vector_index.lock(url):
+        vectorstore = vector_index.replace(url, texts, embeddings)
+
+        # Create retrieval chain
+        qa_chain = RetrievalQA.from_chain_type(
+            chat_model,
+            chain_type="stuff",
+            retriever=vector_index.as_retriever(vectorstore, url)
+        )
+
+        # Query for relevant context
+        return qa_chain.run(CONTEXT_QUERY)
+
+
+def _map_reduce(chat_model, text: str, chunk_tokens: int, max_concurrency: int) -> str:
+    """Summarize large pages section by section in parallel, then combine the summaries."""
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=chunk_tokens,
+        chunk_overlap=0
+    )
+    sections = text_splitter.split_text(text)
+    logger.info(f"Number of map sections: {len(sections)}")
+
+    summaries = chat_model.batch(
+        [MAP_PROMPT.format(text=section) for section in sections],
+        config={"max_concurrency": max_concurrency}
+    )
+    combined = "\n\n".join(summary.content for summary in summaries)
+    return chat_model.invoke(REDUCE_PROMPT.format(text=combined)).content
+
+
+def select_strategy(token_count: int, config: dict) -> str:
+    """Pick the extraction strategy for a page of token_count tokens."""
+    if token_count <= config.get("summarize_max_tokens", 3000):
+        return "summarize"
+    if token_count <= config.get("retrieval_max_tokens", 20000):
+        return "retrieval"
+    return "map_reduce"
+
+
+def extract_context(url: str) -> str:
+    """
+    Scrape a website and extract its key messaging, with a strategy chosen by page size.
+
+    Args:
+        url: URL of the target's website
+
+    Returns:
+        String with contextual information, or an empty string on failure
+    """
+    try:
+        config = get_config_snapshot().target.get("context_extraction", {})
+
+        # Load webpage content through the shared page cache, warm if the page was previewed
+        page = page_fetcher.fetch(url)
+        page_text = BeautifulSoup(page.content, "html.parser", from_encoding=page.encoding).get_text()
+        documents = [Document(page_content=page_text, metadata={"source": page.url})]
+        logger.info(f"Raw document content length: {len(page_text)} characters")
+
+        openai_api_key = os.environ.get("OPENAI_API_KEY")
+        chat_model = RateLimitedChatOpenAI(temperature=0, openai_api_key=openai_api_key)
+
+        token_count = chat_model.get_num_tokens(page_text)
+        strategy = select_strategy(token_count, config)
+
+        started = time.perf_counter()
+        if strategy == "summarize":
+            context = _summarize(chat_model, page_text)
+        elif strategy == "retrieval":
+            context = _retrieve(chat_model, url, documents)
+        else:
+            context = _map_reduce(
+                chat_model,
+                page_text,
+                chunk_tokens=config.get("map_chunk_tokens", 3000),
+                max_concurrency=config.get("map_max_concurrency", 5)
+            )
+        elapsed = time.perf_counter() - started
+
+        metrics.observe(f"context_extraction.{strategy}", elapsed)
+        logger.info(f"Extracted context for {url} with strategy {strategy} ({token_count} tokens) in {elapsed:.2f}s")
+        logger.info(f"Extracted Context:\n{context}")
+
+        return context
+
+    except Exception as e:
+        logger.error(f"Error retrieving contextual information: {str(e)}")
+        return ""
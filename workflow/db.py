@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Database helpers shared by the worker activities and the web app.
+
+The worker initializes a process-wide connection pool at startup with
+init_pool(); connection() then borrows from it. Processes without a pool
+(the web app) get a fresh connection per call.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often each process checks the Postgres-backed caches' size limits
+CACHE_EVICT_INTERVAL_SECONDS = float(os.environ.get("CACHE_EVICT_INTERVAL_SECONDS", "60"))
+
+
+def get_db_connection_params():
+    """Get database connection parameters from environment variables."""
+    return {
+        "host": os.environ.get("DB_HOST", "db"),
+        "port": os.environ.get("DB_PORT", "5432"),
+        "dbname": os.environ.get("DB_NAME", "addb"),
+        "user": os.environ.get("DB_USER", "ad_user"),
+        "password": os.environ.get("DB_PASSWORD", "your_secure_password")
+    }
+
+
+def get_db_connection():
+    """Open a new connection to the PostgreSQL database."""
+    return psycopg2.connect(**get_db_connection_params())
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded psycopg2 connection pool.
+
+    Callers wait (up to acquire_timeout) for a free connection instead of
+    failing when the pool is exhausted. Connections idle for longer than
+    health_check_interval are pinged before use, and connections older than
+    max_lifetime are closed when returned so they get recycled.
+    """
+
+    def __init__(self, min_connections, max_connections, max_lifetime=3600,
+                 health_check_interval=30, acquire_timeout=30):
+        self.max_connections = max_connections
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._pool = pool.ThreadedConnectionPool(min_connections, max_connections, **get_db_connection_params())
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._created_at = {}
+        self._last_used_at = {}
+        self._in_use = 0
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, committing on success and rolling back on error."""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            metrics.incr("db_pool.acquire_timeouts")
+            raise pool.PoolError(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+        metrics.observe("db_pool.wait", time.perf_counter() - started)
+
+        conn = None
+        try:
+            conn = self._checkout()
+            self._update_usage(1)
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self._update_usage(-1)
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+
+    def _checkout(self):
+        """Get a healthy connection from the pool."""
+        conn = self._pool.getconn()
+        now = time.monotonic()
+        self._created_at.setdefault(id(conn), now)
+
+        idle = now - self._last_used_at.get(id(conn), now)
+        if conn.closed or idle > self.health_check_interval:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                logger.warning("Discarding unhealthy database connection")
+                metrics.incr("db_pool.health_check_failures")
+                self._discard(conn)
+                conn = self._pool.getconn()
+                self._created_at.setdefault(id(conn), time.monotonic())
+        return conn
+
+    def _checkin(self, conn):
+        """Return a connection to the pool, closing it if it is broken or past its lifetime."""
+        now = time.monotonic()
+        if conn.closed or now - self._created_at.get(id(conn), now) > self.max_lifetime:
+            if not conn.closed:
+                metrics.incr("db_pool.recycled")
+            self._discard(conn)
+            return
+        self._last_used_at[id(conn)] = now
+        self._pool.putconn(conn)
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        self._last_used_at.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _update_usage(self, delta):
+        with self._lock:
+            self._in_use += delta
+            metrics.set_gauge("db_pool.in_use", self._in_use)
+            metrics.set_gauge("db_pool.utilization", self._in_use / self.max_connections)
+
+    def close(self):
+        """Close all pooled connections."""
+        self._pool.closeall()
+
+
+_pool = None
+
+
+def init_pool(min_connections, max_connections, **kwargs):
+    """Create the process-wide connection pool used by connection()."""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+    _pool = ConnectionPool(min_connections, max_connections, **kwargs)
+    logger.info(f"Database connection pool ready: {min_connections}-{max_connections} connections")
+    return _pool
+
+
+def close_pool():
+    """Close the process-wide connection pool, if any."""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+@contextmanager
+def connection():
+    """
+    Yield a database connection, committing on success and rolling back on error.
+    Uses the process-wide pool when one is initialized; otherwise a new
+    connection is opened and always closed when the block exits.
+    """
+    if _pool is not None:
+        with _pool.connection() as conn:
+            yield conn
+        return
+
+    conn = get_db_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class EvictionSchedule:
+    """
+    Rate-limits cache eviction to once per interval per process, so writes
+    don't each run an eviction query.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._next_run = 0.0
+        self._lock = threading.Lock()
+
+    def due(self) -> bool:
+        """Return True, at most once per interval, when eviction should run."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_run:
+                return False
+            self._next_run = now + self.interval_seconds
+            return True
+
+
+def evict_least_recent(cursor, table: str, order_column: str, key_column: str, max_entries: int) -> int:
+    """
+    Delete the rows of table beyond max_entries with the oldest order_column.
+
+    The cutoff is read by walking the (order_column, key_column) index
+    max_entries rows deep, so nothing is sorted and a table within its limit is
+    left alone. Ties on order_column, e.g. rows written in one transaction, are
+    broken by key_column, so exactly max_entries rows are kept.
+    Returns the number of deleted rows.
+    """
+    # The oldest row that must stay; everything before it in (order_column, key_column) order goes
+    cursor.execute(
+        f"SELECT {order_column}, {key_column} FROM {table} "
+        f"ORDER BY {order_column} DESC, {key_column} DESC OFFSET %s LIMIT 1",
+        (max(max_entries - 1, 0),)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    cursor.execute(f"DELETE FROM {table} WHERE ({order_column}, {key_column}) < (%s, %s)", tuple(row))
+    return cursor.rowcount
+
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for embeddings, shared by the web app and the worker.
+
+Embeddings are stored in Postgres under a hash of the text, namespaced by the
+embedding model name, so re-processing an unchanged page makes no embedding
+API calls. The table is bounded by evicting the least recently used entries.
+"""
+import logging
+import os
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain_core.stores import ByteStore
+
+from workflow.db import CACHE_EVICT_INTERVAL_SECONDS, EvictionSchedule, connection, evict_least_recent
+from workflow.metrics import metrics
+from workflow.openai_models import RateLimitedOpenAIEmbeddings
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresByteStore(ByteStore):
+    """LangChain byte store backed by the embedding_cache table with LRU eviction."""
+
+    def __init__(self, max_entries: int, connection_factory=connection,
+                 evict_interval_seconds: float = CACHE_EVICT_INTERVAL_SECONDS):
+        self.max_entries = max_entries
+        self._eviction = EvictionSchedule(evict_interval_seconds)
+        self._connection = connection_factory
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        UPDATE embedding_cache SET last_used_at = CURRENT_TIMESTAMP
+                        WHERE key = ANY(%s)
+                        RETURNING key, value
+                        """,
+                        (list(keys),)
+                    )
+                    found = {key: bytes(value) for key, value in cursor.fetchall()}
+        except Exception as e:
+            # Treat an unavailable cache as all misses rather than failing the extraction
+            logger.warning(f"Error reading embedding cache: {str(e)}")
+            found = {}
+
+        metrics.incr("embedding_cache.hit", len(found))
+        metrics.incr("embedding_cache.miss", len(keys) - len(found))
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        # Deduplicate so one statement never updates the same row twice
+        values = dict(key_value_pairs)
+        if not values:
+            return
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    execute_values(
+                        cursor,
+                        """
+                        INSERT INTO embedding_cache (key, value)
+                        VALUES %s
+                        ON CONFLICT (key) DO UPDATE SET
+                            value = EXCLUDED.value,
+                            last_used_at = CURRENT_TIMESTAMP
+                        """,
+                        [(key, psycopg2.Binary(value)) for key, value in values.items()]
+                    )
+                    if self._eviction.due():
+                        self._evict(cursor)
+        except Exception as e:
+            logger.warning(f"Error writing embedding cache: {str(e)}")
+
+    def _evict(self, cursor) -> None:
+        """Delete the least recently used entries beyond max_entries."""
+        evicted = evict_least_recent(cursor, "embedding_cache", "last_used_at", "key", self.max_entries)
+        if evicted:
+            metrics.incr("embedding_cache.evicted", evicted)
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM embedding_cache WHERE key = ANY(%s)", (list(keys),))
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                if prefix:
+                    cursor.execute("SELECT key FROM embedding_cache WHERE key LIKE %s", (f"{prefix}%",))
+                else:
+                    cursor.execute("SELECT key FROM embedding_cache")
+                keys = [row[0] for row in cursor.fetchall()]
+        yield from keys
+
+
+embedding_store = PostgresByteStore(
+    max_entries=int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+)
+
+
+def get_cached_embeddings() -> CacheBackedEmbeddings:
+    """
+    Return rate-limited OpenAI embeddings wrapped with the shared cache.
+    Both document chunks and retrieval queries are cached, keyed by the model name
+    and a hash of the text.
+    """
+    underlying = RateLimitedOpenAIEmbeddings(openai_api_key=os.environ.get("OPENAI_API_KEY"))
+    return CacheBackedEmbeddings.from_bytes_store(
+        underlying,
+        embedding_store,
+        namespace=f"{underlying.model}:",
+        query_embedding_cache=True
+    )
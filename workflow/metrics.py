@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Minimal in-process metrics registry shared by the worker and the web app.
+The web app exposes a snapshot at /api/metrics; the worker logs it periodically.
+"""
+import threading
+from collections import defaultdict
+from typing import Any, Dict
+
+
+class Metrics:
+    """Thread-safe counters, gauges and timing summaries."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._timings = {}
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """Increment a counter."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record a duration in seconds."""
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of all metrics, with average durations filled in."""
+        with self._lock:
+            timings = {
+                name: {
+                    **timing,
+                    "avg": timing["total"] / timing["count"] if timing["count"] else 0.0
+                }
+                for name, timing in self._timings.items()
+            }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings
+            }
+
+
+# Process-wide registry
+metrics = Metrics()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Client for the notification service's /send-workflow-notification endpoint.
+
+The worker pushes batch progress through one pooled aiohttp session, reused by
+every push so they don't pay for a new connection each time. Pushes are best
+effort: failures are logged and counted, never raised.
+"""
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationClient:
+    """Async HTTP client for the notification service with a lazily created, pooled session."""
+
+    def __init__(self, base_url: str, timeout_seconds: float = 5, pool_size: int = 10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created on first use, inside the worker's event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+            )
+        return self._session
+
+    async def send_workflow_notification(self, workflow_id: str, status: str, details: Dict[str, Any]) -> bool:
+        """Send a notification to the clients subscribed to a workflow's room."""
+        if not self.enabled:
+            return False
+        try:
+            async with self._get_session().post(
+                f"{self.base_url}/send-workflow-notification",
+                json={"workflow_id": workflow_id, "status": status, "details": details}
+            ) as response:
+                if response.status != 200:
+                    logger.warning(f"Notification for workflow {workflow_id} failed with status {response.status}")
+                    metrics.incr("notifications.failed")
+                    return False
+        except Exception as e:
+            logger.warning(f"Error sending notification for workflow {workflow_id}: {str(e)}")
+            metrics.incr("notifications.failed")
+            return False
+        metrics.incr("notifications.sent")
+        return True
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+notification_client = NotificationClient(os.environ.get("NOTIFICATION_URL", "http://notification:8765"))
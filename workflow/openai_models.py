@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+OpenAI chat and embedding models that wait for rate limit quota before each call.
+Used by both the web app and the worker activities.
+
+Every underlying API request goes through _generate or embed_documents,
+including calls made by invoke(), batch() and bound models, so wrapping them
+covers all call sites. Tokens are counted the way OpenAI counts them against
+the tokens-per-minute limit: the prompt plus max_tokens for the completion.
+"""
+import asyncio
+from typing import Any, List
+
+from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
+
+from workflow.rate_limit import rate_limiter
+
+# Completion tokens reserved for chat calls without max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+# Rough characters per token, for embedding inputs
+CHARS_PER_TOKEN = 4
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+    """ChatOpenAI drawing from the shared "chat" rate limit."""
+
+    def _estimate_tokens(self, messages, max_tokens=None) -> int:
+        """Prompt tokens plus the completion budget, max_tokens bound to the call or set on the model."""
+        try:
+            prompt_tokens = self.get_num_tokens_from_messages(messages)
+        except Exception:
+            prompt_tokens = sum(len(str(message.content)) for message in messages) // CHARS_PER_TOKEN
+        return prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        # Models bound with max_tokens (e.g. batched personalization) pass it per call
+        max_tokens = kwargs.get("max_tokens", self.max_tokens)
+        rate_limiter.acquire("chat", self._estimate_tokens(messages, max_tokens))
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        max_tokens = kwargs.get("max_tokens", self.max_tokens)
+        await asyncio.to_thread(rate_limiter.acquire, "chat", self._estimate_tokens(messages, max_tokens))
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class RateLimitedOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings drawing from the shared "embeddings" rate limit."""
+
+    def embed_documents(self, texts: List[str], *args: Any, **kwargs: Any) -> List[List[float]]:
+        rate_limiter.acquire("embeddings", sum(len(text) for text in texts) // CHARS_PER_TOKEN + 1)
+        return super().embed_documents(texts, *args, **kwargs)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Shared page-fetch layer for previewing and scraping account websites.
+
+Pages are fetched through one pooled keep-alive session with connect and read
+timeouts and a response size cap. Bodies are stored zlib-compressed in the
+page_cache table, shared by the web app and the worker, so a page previewed
+through /fetch-url/ is already cached when its context is extracted. Entries
+older than the TTL are revalidated with a conditional GET (ETag /
+Last-Modified) before the body is downloaded again.
+"""
+import logging
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from psycopg2.extras import Json
+from requests.adapters import HTTPAdapter
+
+from workflow.db import CACHE_EVICT_INTERVAL_SECONDS, EvictionSchedule, connection, evict_least_recent
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so equivalent account URLs share one cache entry."""
+    url = url.strip()
+    if "://" not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class PageTooLargeError(requests.RequestException):
+    """Raised when a response body exceeds the configured size cap."""
+
+
+@dataclass
+class FetchedPage:
+    """A fetched or cached page."""
+    url: str
+    content: bytes
+    content_type: Optional[str]
+    encoding: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: datetime
+    # Results computed from this body (e.g. main-content extraction), keyed by name and version
+    derived: Optional[Dict[str, Any]] = None
+
+    @property
+    def text(self) -> str:
+        """Body decoded with the declared charset, falling back to UTF-8."""
+        try:
+            return self.content.decode(self.encoding or "utf-8", errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+
+class PageFetcher:
+    """Pooled, size-capped HTTP fetcher with a shared compressed page cache."""
+
+    def __init__(
+        self,
+        ttl_seconds: int,
+        max_entries: int,
+        max_bytes: int,
+        connect_timeout: float,
+        read_timeout: float,
+        pool_maxsize: int = 20,
+        connection_factory=connection,
+        evict_interval_seconds: float = CACHE_EVICT_INTERVAL_SECONDS
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._eviction = EvictionSchedule(evict_interval_seconds)
+        self.max_bytes = max_bytes
+        self.timeout = (connect_timeout, read_timeout)
+        self._connection = connection_factory
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._pool_maxsize = pool_maxsize
+
+    @property
+    def session(self) -> requests.Session:
+        """Keep-alive session shared by all fetches in this process."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self._pool_maxsize, pool_maxsize=self._pool_maxsize)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers["User-Agent"] = USER_AGENT
+                    self._session = session
+        return self._session
+
+    def fetch(self, url: str, max_age: Optional[int] = None) -> FetchedPage:
+        """
+        Return the page at url, from the cache when it is younger than max_age
+        seconds (the TTL by default), revalidating or downloading it otherwise.
+
+        Raises:
+            requests.RequestException: if the page cannot be fetched, including
+                PageTooLargeError when the body exceeds the size cap
+        """
+        max_age = self.ttl_seconds if max_age is None else max_age
+        key = normalize_url(url)
+        entry = self._load(key)
+
+        if entry and time.time() - entry.fetched_at.timestamp() < max_age:
+            metrics.incr("page_cache.hit")
+            return entry
+
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        started = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        try:
+            if entry and response.status_code == 304:
+                metrics.incr("page_cache.revalidated")
+                self._touch(key)
+                return entry
+
+            response.raise_for_status()
+            content = self._read_capped(response)
+        finally:
+            response.close()
+        metrics.incr("page_cache.miss")
+        metrics.observe("page_fetch.download", time.perf_counter() - started)
+
+        content_type = response.headers.get("Content-Type")
+        page = FetchedPage(
+            url=response.url,
+            content=content,
+            content_type=content_type,
+            encoding=response.encoding if content_type and "charset" in content_type.lower() else None,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=datetime.now()
+        )
+        self._store(key, page)
+        return page
+
+    def get_derived(self, url: str, name: str, derive: Callable[[FetchedPage], Any]) -> Any:
+        """
+        Return derive(page) for the page at url, cached alongside the page body.
+        The cached result is dropped whenever a new body is stored, so name should
+        include a version that changes with derive's output format.
+        """
+        page = self.fetch(url)
+        if page.derived and name in page.derived:
+            metrics.incr("page_cache.derived_hit")
+            return page.derived[name]
+
+        metrics.incr("page_cache.derived_miss")
+        value = derive(page)
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        UPDATE page_cache
+                        SET derived = COALESCE(derived, '{}'::jsonb) || %s
+                        WHERE url_key = %s
+                        """,
+                        (Json({name: value}), normalize_url(url))
+                    )
+        except Exception as e:
+            logger.warning(f"Error writing derived page cache entry: {str(e)}")
+        return value
+
+    def _read_capped(self, response: requests.Response) -> bytes:
+        """Read the body, giving up as soon as it exceeds max_bytes."""
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise PageTooLargeError(f"Response of {declared} bytes exceeds the {self.max_bytes} byte limit")
+
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise PageTooLargeError(f"Response exceeds the {self.max_bytes} byte limit")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _load(self, key: str) -> Optional[FetchedPage]:
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT final_url, body, content_type, encoding, etag, last_modified, fetched_at, derived
+                        FROM page_cache
+                        WHERE url_key = %s
+                        """,
+                        (key,)
+                    )
+                    row = cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"Error reading page cache: {str(e)}")
+            return None
+
+        if not row:
+            return None
+        final_url, body, content_type, encoding, etag, last_modified, fetched_at, derived = row
+        return FetchedPage(
+            url=final_url,
+            content=zlib.decompress(bytes(body)),
+            content_type=content_type,
+            encoding=encoding,
+            etag=etag,
+            last_modified=last_modified,
+            fetched_at=fetched_at,
+            derived=derived
+        )
+
+    def _store(self, key: str, page: FetchedPage) -> None:
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        INSERT INTO page_cache
+                        (url_key, final_url, body, size_bytes, content_type, encoding, etag, last_modified, fetched_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                        ON CONFLICT (url_key) DO UPDATE SET
+                            final_url = EXCLUDED.final_url,
+                            body = EXCLUDED.body,
+                            size_bytes = EXCLUDED.size_bytes,
+                            content_type = EXCLUDED.content_type,
+                            encoding = EXCLUDED.encoding,
+                            etag = EXCLUDED.etag,
+                            last_modified = EXCLUDED.last_modified,
+                            fetched_at = EXCLUDED.fetched_at,
+                            derived = NULL,
+                            updated_at = CURRENT_TIMESTAMP
+                        """,
+                        (
+                            key,
+                            page.url,
+                            zlib.compress(page.content),
+                            len(page.content),
+                            page.content_type,
+                            page.encoding,
+                            page.etag,
+                            page.last_modified
+                        )
+                    )
+                    if self._eviction.due():
+                        self._evict(cursor)
+        except Exception as e:
+            logger.warning(f"Error writing page cache: {str(e)}")
+
+    def _evict(self, cursor) -> None:
+        """Delete the least recently fetched pages beyond max_entries."""
+        evicted = evict_least_recent(cursor, "page_cache", "fetched_at", "url_key", self.max_entries)
+        if evicted:
+            metrics.incr("page_cache.evicted", evicted)
+
+    def _touch(self, key: str) -> None:
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE page_cache SET fetched_at = CURRENT_TIMESTAMP WHERE url_key = %s",
+                        (key,)
+                    )
+        except Exception as e:
+            logger.warning(f"Error refreshing page cache entry: {str(e)}")
+
+
+page_fetcher = PageFetcher(
+    ttl_seconds=int(os.environ.get("PAGE_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", "10000")),
+    max_bytes=int(os.environ.get("PAGE_FETCH_MAX_BYTES", str(5 * 1024 * 1024))),
+    connect_timeout=float(os.environ.get("PAGE_FETCH_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.environ.get("PAGE_FETCH_READ_TIMEOUT", "15"))
+)
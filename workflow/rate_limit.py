@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Token-bucket limiter for OpenAI calls, shared by the web app and the worker.
+
+Each scope ("chat", "embeddings") has a requests-per-minute and a
+tokens-per-minute bucket, configured in the `rate_limit` section of
+target_workflow_config.yaml. Callers wait for quota instead of sending requests
+that would be rejected with 429s. With the "postgres" backend the buckets live
+in the rate_limit_buckets table, so all web and worker processes draw from the
+same quota; the "local" backend keeps them in process memory as a stand-in for
+development and single-process setups.
+
+Batch callers (the worker) may not drain a bucket below its interactive
+reserve, which keeps that share of the quota for interactive callers (the web app).
+"""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from workflow.config import get_config_snapshot
+from workflow.db import connection
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Longest sleep between attempts, so waiters notice quota freed by refills promptly
+MAX_POLL_INTERVAL = 1.0
+
+
+class RateLimitTimeout(Exception):
+    """Raised when quota doesn't become available within max_wait_seconds."""
+
+
+@dataclass
+class Bucket:
+    """One bucket of a request: the amount it needs and the bucket's configuration."""
+    name: str
+    amount: float
+    capacity: float
+    rate: float  # refill per second
+    floor: float  # level the caller may not go below
+
+    def refill(self, level: float, elapsed: float) -> float:
+        return min(self.capacity, level + max(0.0, elapsed) * self.rate)
+
+    def wait_time(self, level: float) -> float:
+        """Seconds until the bucket holds amount above floor; 0 if it already does."""
+        return max(0.0, (self.amount + self.floor - level) / self.rate)
+
+
+class TokenBucketLimiter:
+    """Request and token rate limiter with Postgres and in-process backends."""
+
+    def __init__(self, connection_factory=connection):
+        self._connection = connection_factory
+        self.default_priority = BATCH
+        self._local_levels: Dict[str, Tuple[float, float]] = {}
+        self._local_lock = threading.Lock()
+
+    def acquire(self, scope: str, tokens: int, priority: Optional[str] = None) -> None:
+        """
+        Wait until one request of `tokens` tokens fits in the scope's buckets and take it.
+
+        Args:
+            scope: Limit section to draw from, e.g. "chat" or "embeddings"
+            tokens: Estimated tokens of the request, including the completion
+            priority: INTERACTIVE or BATCH; defaults to the process's default_priority
+
+        Raises:
+            RateLimitTimeout: If the quota isn't available within max_wait_seconds
+        """
+        config = get_config_snapshot().target.get("rate_limit") or {}
+        limits = (config.get("limits") or {}).get(scope)
+        if not config.get("enabled", True) or not limits:
+            return
+
+        priority = priority or self.default_priority
+        reserve = 0.0 if priority == INTERACTIVE else float(config.get("interactive_reserve", 0.0))
+        buckets = []
+        for kind, amount in (("requests", 1), ("tokens", tokens)):
+            per_minute = limits.get(f"{kind}_per_minute")
+            if not per_minute:
+                continue
+            capacity = float(per_minute)
+            floor = capacity * reserve
+            # A request larger than the usable capacity would never fit; let it drain the bucket instead
+            buckets.append(Bucket(
+                name=f"{scope}:{kind}",
+                amount=min(float(amount), capacity - floor),
+                capacity=capacity,
+                rate=capacity / 60.0,
+                floor=floor
+            ))
+        if not buckets:
+            return
+
+        try_acquire = self._try_acquire_local if config.get("backend") == "local" else self._try_acquire_postgres
+        max_wait = float(config.get("max_wait_seconds", 120))
+        started = time.monotonic()
+        while True:
+            try:
+                wait = try_acquire(buckets)
+            except Exception as e:
+                # Never block model calls on the limiter itself; OpenAI still enforces its limits
+                logger.warning(f"Error acquiring rate limit quota for {scope}: {str(e)}")
+                metrics.incr("rate_limit.errors")
+                return
+
+            waited = time.monotonic() - started
+            if wait == 0:
+                metrics.observe(f"rate_limit.{scope}.wait", waited)
+                return
+            if waited + wait > max_wait:
+                metrics.incr(f"rate_limit.{scope}.timeouts")
+                raise RateLimitTimeout(
+                    f"No {scope} quota for {tokens} tokens within {max_wait:.0f}s ({priority} priority)"
+                )
+            metrics.incr(f"rate_limit.{scope}.throttled")
+            # Jitter keeps waiters in other processes from retrying in lockstep
+            time.sleep(min(wait, MAX_POLL_INTERVAL) + random.uniform(0, 0.05))
+
+    def _try_acquire_local(self, buckets: List[Bucket]) -> float:
+        """Take the amounts from in-process buckets, or return how long to wait."""
+        with self._local_lock:
+            now = time.monotonic()
+            levels = []
+            for bucket in buckets:
+                level, updated_at = self._local_levels.get(bucket.name, (bucket.capacity, now))
+                levels.append(bucket.refill(level, now - updated_at))
+            wait = max(bucket.wait_time(level) for bucket, level in zip(buckets, levels))
+            if wait == 0:
+                for bucket, level in zip(buckets, levels):
+                    self._local_levels[bucket.name] = (level - bucket.amount, now)
+            return wait
+
+    def _try_acquire_postgres(self, buckets: List[Bucket]) -> float:
+        """Take the amounts from the shared buckets in one transaction, or return how long to wait."""
+        names = sorted(bucket.name for bucket in buckets)
+        with self._connection() as conn:
+            with conn.cursor() as cursor:
+                # New buckets start full
+                execute_values(
+                    cursor,
+                    "INSERT INTO rate_limit_buckets (name, level) VALUES %s ON CONFLICT (name) DO NOTHING",
+                    [(bucket.name, bucket.capacity) for bucket in buckets]
+                )
+                # Rows are locked in name order so concurrent callers can't deadlock;
+                # elapsed time uses the database clock so process clocks don't matter
+                cursor.execute(
+                    """
+                    SELECT name, level, EXTRACT(EPOCH FROM clock_timestamp() - updated_at)
+                    FROM rate_limit_buckets
+                    WHERE name = ANY(%s)
+                    ORDER BY name
+                    FOR UPDATE
+                    """,
+                    (names,)
+                )
+                rows = {name: (level, float(elapsed)) for name, level, elapsed in cursor.fetchall()}
+                levels = [bucket.refill(*rows[bucket.name]) for bucket in buckets]
+                wait = max(bucket.wait_time(level) for bucket, level in zip(buckets, levels))
+                if wait == 0:
+                    execute_values(
+                        cursor,
+                        """
+                        UPDATE rate_limit_buckets AS b
+                        SET level = v.level, updated_at = clock_timestamp()
+                        FROM (VALUES %s) AS v (name, level)
+                        WHERE b.name = v.name
+                        """,
+                        [(bucket.name, level - bucket.amount) for bucket, level in zip(buckets, levels)]
+                    )
+                return wait
+
+
+rate_limiter = TokenBucketLimiter()
+
+
+def set_default_priority(priority: str) -> None:
+    """Set the priority of this process's model calls, INTERACTIVE for the web app."""
+    rate_limiter.default_priority = priority
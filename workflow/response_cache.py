@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Exact-match cache of LLM responses, shared by the web app and the worker.
+
+Entries are keyed by a hash of the model, temperature, prompt-template version
+and whitespace-normalized prompt inputs, so repeating the same personalization
+returns the stored text instead of calling the model again. Entries expire
+after a TTL, and the least recently used entries are evicted beyond a maximum
+count. Each entry stores how long it took to generate, which is reported as
+latency saved when it is served.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from workflow.db import CACHE_EVICT_INTERVAL_SECONDS, EvictionSchedule, connection, evict_least_recent
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Part of every cache key. The web app and the worker write the same entries, so
+# there is one version for both; bump it when the personalization prompts in
+# web/ad_composer/personalization.py or workflow/target_activities.py change.
+PROMPT_TEMPLATE_VERSION = "1"
+
+
+def _normalize(value: Any) -> Any:
+    """Collapse whitespace in strings so formatting-only differences share an entry."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+class ResponseCache:
+    """Postgres-backed LLM response cache with TTL and LRU eviction."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int, connection_factory=connection,
+                 evict_interval_seconds: float = CACHE_EVICT_INTERVAL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._eviction = EvictionSchedule(evict_interval_seconds)
+        self._connection = connection_factory
+        self._lookups = 0
+        self._hits = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, template_version: str, inputs: Dict[str, Any]) -> str:
+        """Cache key for one generation."""
+        payload = json.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "template_version": template_version,
+                "inputs": _normalize(inputs)
+            },
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_many(self, keys: Sequence[str], bypass: bool = False) -> Dict[str, str]:
+        """Return the cached responses for keys that have a fresh entry."""
+        if bypass:
+            metrics.incr("llm_cache.bypass", len(keys))
+            return {}
+        if not keys:
+            return {}
+
+        found = {}
+        saved_ms = 0
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        UPDATE llm_response_cache
+                        SET last_used_at = CURRENT_TIMESTAMP, hit_count = hit_count + 1
+                        WHERE key = ANY(%s)
+                          AND created_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+                        RETURNING key, response, latency_ms
+                        """,
+                        (list(keys), self.ttl_seconds)
+                    )
+                    for key, response, latency_ms in cursor.fetchall():
+                        found[key] = response
+                        saved_ms += latency_ms or 0
+        except Exception as e:
+            # Treat an unavailable cache as all misses rather than failing the request
+            logger.warning(f"Error reading LLM response cache: {str(e)}")
+
+        hits = sum(1 for key in keys if key in found)
+        metrics.incr("llm_cache.hit", hits)
+        metrics.incr("llm_cache.miss", len(keys) - hits)
+        metrics.incr("llm_cache.latency_saved_ms", saved_ms)
+        with self._stats_lock:
+            self._lookups += len(keys)
+            self._hits += hits
+            metrics.set_gauge("llm_cache.hit_ratio", self._hits / self._lookups)
+        return found
+
+    def set_many(self, entries: Sequence[Tuple[str, str, str, float]]) -> None:
+        """Store (key, model, response, latency_seconds) entries and evict old ones."""
+        rows = {
+            key: (key, model, response, int(latency * 1000))
+            for key, model, response, latency in entries
+            if response
+        }
+        if not rows:
+            return
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cursor:
+                    execute_values(
+                        cursor,
+                        """
+                        INSERT INTO llm_response_cache (key, model, response, latency_ms)
+                        VALUES %s
+                        ON CONFLICT (key) DO UPDATE SET
+                            response = EXCLUDED.response,
+                            latency_ms = EXCLUDED.latency_ms,
+                            created_at = CURRENT_TIMESTAMP,
+                            last_used_at = CURRENT_TIMESTAMP
+                        """,
+                        list(rows.values())
+                    )
+                    if self._eviction.due():
+                        self._evict(cursor)
+        except Exception as e:
+            logger.warning(f"Error writing LLM response cache: {str(e)}")
+
+    def _evict(self, cursor) -> None:
+        """Delete expired entries and the least recently used ones beyond max_entries."""
+        cursor.execute(
+            "DELETE FROM llm_response_cache WHERE created_at <= CURRENT_TIMESTAMP - make_interval(secs => %s)",
+            (self.ttl_seconds,)
+        )
+        evicted = cursor.rowcount
+        evicted += evict_least_recent(cursor, "llm_response_cache", "last_used_at", "key", self.max_entries)
+        if evicted:
+            metrics.incr("llm_cache.evicted", evicted)
+
+    def get_or_generate(self, key: str, model: str, generate: Callable[[], str], bypass: bool = False) -> str:
+        """
+        Return the cached response for key, or call generate() and store its result.
+        With bypass the cache is not read, but the fresh response replaces the entry.
+        """
+        cached = self.get_many([key], bypass=bypass)
+        if key in cached:
+            return cached[key]
+
+        started = time.perf_counter()
+        response = generate()
+        self.set_many([(key, model, response, time.perf_counter() - started)])
+        return response
+
+
+response_cache = ResponseCache(
+    ttl_seconds=int(os.environ.get("LLM_CACHE_TTL_SECONDS", "604800")),
+    max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "100000"))
+)
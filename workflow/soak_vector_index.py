@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Soak test for the per-account vector index.
+
+Indexes and queries synthetic chunks for many distinct accounts, the way
+extract_context does, and prints the process RSS as it goes. With the LRU
+segment cache and client recycling the RSS should level off instead of
+growing with the number of accounts. Uses fake embeddings, so no API key or database is needed.
+RSS rises and falls within each recycle cycle, so compare reports at the same
+position in the cycle. Set MALLOC_MMAP_THRESHOLD_ as the Dockerfiles do.
+
+Usage: MALLOC_MMAP_THRESHOLD_=131072 python -m workflow.soak_vector_index --accounts 5000 --report-every 256
+"""
+import argparse
+import random
+import resource
+import string
+import tempfile
+import time
+
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_core.documents import Document
+
+from workflow.vector_index import VectorIndex
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        # No procfs (e.g. macOS): fall back to the peak RSS, reported in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)
+
+
+def random_chunks(count: int, length: int):
+    return [
+        Document(page_content="".join(random.choices(string.ascii_lowercase + " ", k=length)))
+        for _ in range(count)
+    ]
+
+
+def index_and_query(index: VectorIndex, url: str, chunks, embeddings):
+    """Index and query one account like extract_context, keeping the store inside the lock."""
+    with index.lock(url):
+        vectorstore = index.replace(url, chunks, embeddings)
+        return index.as_retriever(vectorstore, url).invoke("key messaging")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the vector index keeps memory flat across accounts")
+    parser.add_argument("--accounts", type=int, default=5000, help="Distinct accounts to index")
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks per account")
+    parser.add_argument("--memory-limit-mb", type=int, default=64, help="Chroma segment cache limit")
+    parser.add_argument("--report-every", type=int, default=250, help="Print RSS every N accounts")
+    args = parser.parse_args()
+
+    embeddings = FakeEmbeddings(size=1536)
+    with tempfile.TemporaryDirectory() as persist_directory:
+        index = VectorIndex(persist_directory, args.memory_limit_mb * 1024 * 1024)
+        started = time.perf_counter()
+        print(f"{'accounts':>8} {'rss_mb':>8} {'elapsed_s':>9}")
+        for i in range(1, args.accounts + 1):
+            url = f"https://account-{i}.example.com"
+            results = index_and_query(index, url, random_chunks(args.chunks, 1000), embeddings)
+            assert all(doc.metadata["account_url"] == f"{url}/" for doc in results)
+            if i % args.report_every == 0 or i == 1:
+                print(f"{i:>8} {current_rss_mb():>8.1f} {time.perf_counter() - started:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,28 @@
 #!/usr/bin/env python3
 """
 Activities for the target workflow.
+
+These activities call blocking code (psycopg2, web scraping, embeddings and
+LLM calls), so they are plain functions that the worker runs on its activity
+thread pool rather than coroutines on its event loop.
 """
 import logging
 import os
-import yaml
 from datetime import timedelta, datetime
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import RetrievalQA
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI
+from psycopg2.extras import RealDictCursor, execute_values
 
 from temporalio import activity
 
+from workflow.config import get_config_snapshot
+from workflow.context_cache import context_cache
+from workflow.context_extraction import extract_context
+from workflow.db import connection
+from workflow.openai_models import RateLimitedChatOpenAI
+from workflow.response_cache import PROMPT_TEMPLATE_VERSION, response_cache
+
 logger = logging.getLogger(__name__)
 
 # Define dataclasses for activity parameters
@@ -31,6 +34,7 @@ class PersonalizeContentInput:
     target_context: str
     text: str
     text_type: str
+    bypass_cache: bool = False  # Regenerate even if a cached response exists
 
 @dataclass
 class SaveContentInput:
@@ -40,24 +44,34 @@ class SaveContentInput:
     original_text: str
     personalized_text: str
     text_type: str
+    job_key: Optional[str] = None
 
-# Load configuration
-def _load_config():
-    """Load configuration from YAML file."""
-    config_path = os.path.join(os.path.dirname(__file__), "config", "target_workflow_config.yaml")
-    with open(config_path, "r") as f:
-        return yaml.safe_load(f)
+@dataclass
+class AccountSelector:
+    """Selects the target accounts of a segment batch."""
+    kind: str  # "all", "industry" or "ids"
+    industry_id: Optional[int] = None  # for "industry", matched through account_industries
+    account_ids: Optional[List[int]] = None  # for "ids"
 
-# Database connection
-def _get_db_connection():
-    """Get a connection to the PostgreSQL database."""
-    return psycopg2.connect(
-        host=os.environ.get("DB_HOST", "db"),
-        port=int(os.environ.get("DB_PORT", "5432")),
-        dbname=os.environ.get("DB_NAME", "addb"),
-        user=os.environ.get("DB_USER", "ad_user"),
-        password=os.environ.get("DB_PASSWORD", "your_secure_password")
-    )
+@dataclass
+class AccountIdsPageInput:
+    """Input parameters for get_account_ids_page_activity."""
+    selector: AccountSelector
+    after_id: int = 0  # return IDs greater than this one
+    limit: int = 1000
+
+@dataclass
+class BatchJobsPageInput:
+    """Input parameters for get_batch_jobs_page_activity."""
+    workflow_id: str
+    from_index: int = 0  # return jobs from this job index on
+    limit: int = 200
+
+@dataclass
+class DeleteBatchJobsInput:
+    """Input parameters for delete_batch_jobs_activity."""
+    workflow_id: str
+    before_index: int  # delete jobs with a lower job index
 
 def _serialize_dict(data: Dict[str, Any]) -> Dict[str, Any]:
     """Convert datetime objects to ISO format strings in a dictionary."""
@@ -73,7 +87,7 @@ def _serialize_dict(data: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 @activity.defn
-async def get_company_info_activity(company_info_id: int) -> Dict[str, Any]:
+def get_company_info_activity(company_info_id: int) -> Dict[str, Any]:
     """
     Get company information from the database.
     
@@ -86,7 +100,7 @@ async def get_company_info_activity(company_info_id: int) -> Dict[str, Any]:
     activity.logger.info(f"Getting company info for ID: {company_info_id}")
     
     try:
-        with _get_db_connection() as conn:
+        with connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(
                     "SELECT * FROM company_info WHERE id = %s",
@@ -105,7 +119,7 @@ async def get_company_info_activity(company_info_id: int) -> Dict[str, Any]:
         raise
 
 @activity.defn
-async def get_target_account_activity(target_account_id: int) -> Dict[str, Any]:
+def get_target_account_activity(target_account_id: int) -> Dict[str, Any]:
     """
     Get target account information from the database.
     
@@ -118,7 +132,7 @@ async def get_target_account_activity(target_account_id: int) -> Dict[str, Any]:
     activity.logger.info(f"Getting target account for ID: {target_account_id}")
     
     try:
-        with _get_db_connection() as conn:
+        with connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(
                     "SELECT * FROM accounts WHERE id = %s",
@@ -137,62 +151,175 @@ async def get_target_account_activity(target_account_id: int) -> Dict[str, Any]:
         raise
 
 @activity.defn
-async def get_contextual_information_activity(url: str) -> str:
+def get_company_infos_activity(company_info_ids: List[int]) -> List[Dict[str, Any]]:
     """
-    Get contextual information from a target's website.
+    Get several company info rows from the database in one query.
     
     Args:
-        url: URL of the target's website
+        company_info_ids: IDs of the company infos to retrieve
         
     Returns:
-        String with contextual information
+        List of dictionaries with company information; missing IDs are omitted
     """
-    activity.logger.info(f"Getting contextual information from URL: {url}")
+    activity.logger.info(f"Getting company info for {len(company_info_ids)} IDs")
     
     try:
-        # Load webpage content
-        loader = WebBaseLoader(url)
-        documents = loader.load()
-        
-        # Log raw document content
-        activity.logger.info(f"Raw document content length: {len(documents[0].page_content)} characters")
-        
-        # Split content into chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_documents(documents)
-        
-        # Log split texts
-        activity.logger.info(f"Number of text chunks: {len(texts)}")
+        with connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    "SELECT * FROM company_info WHERE id = ANY(%s)",
+                    (list(company_info_ids),)
+                )
+                return [_serialize_dict(dict(row)) for row in cursor.fetchall()]
+    except Exception as e:
+        activity.logger.error(f"Error getting company infos: {str(e)}")
+        raise
+
+@activity.defn
+def get_target_accounts_activity(target_account_ids: List[int]) -> List[Dict[str, Any]]:
+    """
+    Get several target accounts from the database in one query.
+    
+    Args:
+        target_account_ids: IDs of the target accounts to retrieve
         
-        # Create embeddings and vector store
-        config = _load_config()
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-        embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-        vectorstore = Chroma.from_documents(texts, embeddings)
+    Returns:
+        List of dictionaries with target account information; missing IDs are omitted
+    """
+    activity.logger.info(f"Getting target accounts for {len(target_account_ids)} IDs")
+    
+    try:
+        with connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    "SELECT * FROM accounts WHERE id = ANY(%s)",
+                    (list(target_account_ids),)
+                )
+                return [_serialize_dict(dict(row)) for row in cursor.fetchall()]
+    except Exception as e:
+        activity.logger.error(f"Error getting target accounts: {str(e)}")
+        raise
+
+@activity.defn
+def get_account_ids_page_activity(input_params: AccountIdsPageInput) -> List[int]:
+    """
+    Get one page of the account IDs matching a selector, in ID order.
+    
+    Args:
+        input_params: AccountIdsPageInput with the selector, the last ID of the
+            previous page (keyset pagination) and the page size
         
-        # Create retrieval chain
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-        qa_chain = RetrievalQA.from_chain_type(
-            ChatOpenAI(temperature=0, openai_api_key=openai_api_key),
-            chain_type="stuff",
-            retriever=vectorstore.as_retriever()
-        )
+    Returns:
+        Up to limit account IDs greater than after_id; fewer means this is the last page
+    """
+    selector = input_params.selector
+    activity.logger.info(f"Getting account IDs for {selector.kind} selector after ID {input_params.after_id}")
+    
+    if selector.kind == "all":
+        query = "SELECT id FROM accounts WHERE id > %s ORDER BY id LIMIT %s"
+        args = (input_params.after_id, input_params.limit)
+    elif selector.kind == "industry":
+        query = """
+            SELECT account_id FROM account_industries
+            WHERE industry_id = %s AND account_id > %s
+            ORDER BY account_id LIMIT %s
+        """
+        args = (selector.industry_id, input_params.after_id, input_params.limit)
+    elif selector.kind == "ids":
+        # Joined with accounts so unknown IDs are skipped
+        query = "SELECT id FROM accounts WHERE id = ANY(%s) AND id > %s ORDER BY id LIMIT %s"
+        args = (list(selector.account_ids or []), input_params.after_id, input_params.limit)
+    else:
+        raise ValueError(f"Unknown account selector: {selector.kind}")
+    
+    try:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, args)
+                return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        activity.logger.error(f"Error getting account IDs: {str(e)}")
+        raise
+
+@activity.defn
+def get_batch_jobs_page_activity(input_params: BatchJobsPageInput) -> List[Dict[str, Any]]:
+    """
+    Get one page of the jobs a batch staged in batch_jobs, in job index order.
+    
+    Args:
+        input_params: BatchJobsPageInput with the batch's workflow ID, the first
+            job index to return and the page size
         
-        # Query for relevant context
-        context_query = "Extract the key messaging, brand positioning, and main pain points of this company"
-        context = qa_chain.run(context_query)
+    Returns:
+        Up to limit job rows with job_index, company_info_id, target_account_id,
+        target_type and target_text
+    """
+    activity.logger.info(
+        f"Getting staged jobs of {input_params.workflow_id} from index {input_params.from_index}"
+    )
+    
+    try:
+        with connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    SELECT job_index, company_info_id, target_account_id, target_type, target_text
+                    FROM batch_jobs
+                    WHERE workflow_id = %s AND job_index >= %s
+                    ORDER BY job_index LIMIT %s
+                    """,
+                    (input_params.workflow_id, input_params.from_index, input_params.limit)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        activity.logger.error(f"Error getting staged batch jobs: {str(e)}")
+        raise
+
+@activity.defn
+def delete_batch_jobs_activity(input_params: DeleteBatchJobsInput) -> int:
+    """
+    Delete the staged jobs of a batch that were handled already.
+    
+    Args:
+        input_params: DeleteBatchJobsInput with the batch's workflow ID and the
+            first job index to keep
         
-        # Log extracted context
-        activity.logger.info(f"Extracted Context:\n{context}")
+    Returns:
+        Number of rows deleted
+    """
+    try:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM batch_jobs WHERE workflow_id = %s AND job_index < %s",
+                    (input_params.workflow_id, input_params.before_index)
+                )
+                return cursor.rowcount
+    except Exception as e:
+        activity.logger.error(f"Error deleting staged batch jobs: {str(e)}")
+        raise
+
+@activity.defn
+def get_contextual_information_activity(url: str) -> str:
+    """
+    Get contextual information from a target's website.
+    
+    Args:
+        url: URL of the target's website
         
-        return context
+    Returns:
+        String with contextual information
+    """
+    activity.logger.info(f"Getting contextual information from URL: {url}")
     
-    except Exception as e:
-        activity.logger.error(f"Error retrieving contextual information: {str(e)}")
-        return ""
+    # Served from the context cache shared with the web app when possible
+    context = context_cache.get(url, extract_context)
+    activity.logger.info(f"Extracted Context:\n{context}")
+    
+    return context
 
 @activity.defn
-async def generate_personalized_content_activity(input_params: PersonalizeContentInput) -> str:
+def generate_personalized_content_activity(input_params: PersonalizeContentInput) -> str:
     """
     Generate personalized content using OpenAI.
     
@@ -210,13 +337,13 @@ async def generate_personalized_content_activity(input_params: PersonalizeConten
     activity.logger.info(f"Generating personalized content for {input_params.target_account['name']}, type: {input_params.text_type}")
     
     try:
-        # Load OpenAI settings from config
-        config = _load_config()
+        # Load OpenAI settings from the config snapshot (re-read only when the file changes)
+        config = get_config_snapshot().target
         openai_config = config.get("openai", {})
         
-        # Use LangChain's ChatOpenAI for personalization
+        # Use LangChain's ChatOpenAI for personalization, waiting for shared rate limit quota
         openai_api_key = os.environ.get("OPENAI_API_KEY")
-        chat_model = ChatOpenAI(
+        chat_model = RateLimitedChatOpenAI(
             model=openai_config.get("model", "gpt-3.5-turbo"),
             temperature=openai_config.get("temperature", 0.7),
             max_tokens=openai_config.get("max_tokens", 1000),
@@ -246,8 +373,27 @@ async def generate_personalized_content_activity(input_params: PersonalizeConten
         Personalized version:
         """
         
-        response = chat_model.invoke(prompt)
-        personalized_text = response.content
+        # Identical personalizations are served from the response cache shared with the web app
+        model = openai_config.get("model", "gpt-3.5-turbo")
+        cache_key = response_cache.make_key(
+            model,
+            openai_config.get("temperature", 0.7),
+            PROMPT_TEMPLATE_VERSION,
+            {
+                "company_name": input_params.company_info['company_name'],
+                "company_description": input_params.company_info['company_description'],
+                "target_account": input_params.target_account['name'],
+                "target_context": input_params.target_context,
+                "text_type": input_params.text_type,
+                "text": input_params.text
+            }
+        )
+        personalized_text = response_cache.get_or_generate(
+            cache_key,
+            model,
+            lambda: chat_model.invoke(prompt).content,
+            bypass=input_params.bypass_cache
+        )
         
         activity.logger.info(f"Generated personalized content for {input_params.target_account['name']}")
         return personalized_text
@@ -257,7 +403,7 @@ async def generate_personalized_content_activity(input_params: PersonalizeConten
         raise
 
 @activity.defn
-async def save_personalized_content_activity(input_params: SaveContentInput) -> bool:
+def save_personalized_content_activity(input_params: SaveContentInput) -> bool:
     """
     Save personalized content to the database.
     
@@ -268,6 +414,7 @@ async def save_personalized_content_activity(input_params: SaveContentInput) ->
             - original_text: Original text
             - personalized_text: Personalized text
             - text_type: Type of text
+            - job_key: Optional per-job key; a row already saved under it is not duplicated
         
     Returns:
         Boolean indicating success
@@ -275,25 +422,73 @@ async def save_personalized_content_activity(input_params: SaveContentInput) ->
     activity.logger.info(f"Saving personalized content for company {input_params.company_info_id}, target {input_params.target_account_id}")
     
     try:
-        with _get_db_connection() as conn:
+        with connection() as conn:
             with conn.cursor() as cursor:
                 # Insert personalized content
                 cursor.execute(
                     """
                     INSERT INTO personalized_content
-                    (company_info_id, target_account_id, original_text, personalized_text, text_type)
-                    VALUES (%s, %s, %s, %s, %s)
+                    (company_info_id, target_account_id, original_text, personalized_text, text_type, job_key)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (job_key) DO NOTHING
                     RETURNING id
                     """,
                     (input_params.company_info_id, input_params.target_account_id,
-                     input_params.original_text, input_params.personalized_text, input_params.text_type)
+                     input_params.original_text, input_params.personalized_text, input_params.text_type,
+                     input_params.job_key)
                 )
                 result = cursor.fetchone()
-                conn.commit()
                 
-                activity.logger.info(f"Saved personalized content with ID: {result[0]}")
+                if result:
+                    activity.logger.info(f"Saved personalized content with ID: {result[0]}")
+                else:
+                    activity.logger.info(f"Personalized content already saved for job {input_params.job_key}")
                 return True
     
     except Exception as e:
         activity.logger.error(f"Error saving personalized content: {str(e)}")
+        raise
+
+@activity.defn
+def save_personalized_content_batch_activity(items: List[SaveContentInput]) -> int:
+    """
+    Save a batch of personalized content rows with a single multi-row INSERT.
+    
+    Rows whose job_key is already present are skipped, so retrying the
+    activity (or the workflow) never creates duplicate rows.
+    
+    Args:
+        items: SaveContentInput objects, each with a job_key
+        
+    Returns:
+        Number of rows inserted
+    """
+    activity.logger.info(f"Saving batch of {len(items)} personalized content rows")
+    
+    try:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                inserted = execute_values(
+                    cursor,
+                    """
+                    INSERT INTO personalized_content
+                    (company_info_id, target_account_id, original_text, personalized_text, text_type, job_key)
+                    VALUES %s
+                    ON CONFLICT (job_key) DO NOTHING
+                    RETURNING id
+                    """,
+                    [
+                        (item.company_info_id, item.target_account_id, item.original_text,
+                         item.personalized_text, item.text_type, item.job_key)
+                        for item in items
+                    ],
+                    page_size=len(items) or 1,
+                    fetch=True
+                )
+        
+        activity.logger.info(f"Saved {len(inserted)} of {len(items)} personalized content rows")
+        return len(inserted)
+    
+    except Exception as e:
+        activity.logger.error(f"Error saving personalized content batch: {str(e)}")
         raise
\ No newline at end of file
@@ -12,8 +12,6 @@ from temporalio.common import RetryPolicy
 from temporalio.exceptions import ApplicationError
 from temporalio.workflow import unsafe
 
-from workflow.common_activities import load_config_activity
-
 @dataclass
 class PersonalizationTarget:
     """Represents a target for personalization with type and text."""
@@ -26,8 +24,20 @@ class TargetWorkflowParams:
     company_info_id: int
     target_account_id: int
     personalization_target: PersonalizationTarget
+    job_key: Optional[str] = None
+    defer_save: bool = False  # Parent workflow saves the result in bulk
+    # Lookups prefetched once per batch by the parent workflow; fetched here when missing
+    company_info: Optional[Dict[str, Any]] = None
+    target_account: Optional[Dict[str, Any]] = None
+    target_context: Optional[str] = None
+    # Target workflow config section and the snapshot version it came from;
+    # loaded with an activity when missing
+    config: Optional[Dict[str, Any]] = None
+    config_version: Optional[str] = None
+    bypass_cache: bool = False  # Regenerate even if a cached response exists
 
 with unsafe.imports_passed_through():
+    from workflow.common_activities import load_config_snapshot_activity
     from workflow.target_activities import (
         get_company_info_activity,
         get_target_account_activity,
@@ -54,6 +64,12 @@ class TargetWorkflow:
                 - company_info_id: ID of the company info to use
                 - target_account_id: ID of the target account
                 - personalization_target: Object with type and text
+                - job_key: Optional idempotency key for the saved row
+                - defer_save: Skip saving and leave it to the parent workflow
+                - company_info, target_account, target_context: Optional
+                  prefetched lookups that replace the corresponding activities
+                - config, config_version: Optional target config section and its version
+                - bypass_cache: Skip the LLM response cache when generating
             
         Returns:
             Dictionary with personalization results
@@ -62,12 +78,16 @@ class TargetWorkflow:
         company_info_id = params.company_info_id
         target_account_id = params.target_account_id
         personalization_target = params.personalization_target
-        # Load configuration
-        config = await workflow.execute_activity(
-            load_config_activity,
-            "target_workflow_config.yaml",
-            start_to_close_timeout=timedelta(seconds=5)
-        )
+        # Use the config passed in by the parent, so runs don't need a config activity
+        config = params.config
+        config_version = params.config_version
+        if config is None:
+            config_snapshot = await workflow.execute_activity(
+                load_config_snapshot_activity,
+                start_to_close_timeout=timedelta(seconds=5)
+            )
+            config = config_snapshot.target
+            config_version = config_snapshot.version
         
         # Get configuration values
         activity_timeout = config.get("timeouts", {}).get("activity", 300)
@@ -86,30 +106,34 @@ class TargetWorkflow:
         
         try:
             # Get company info
-            company_info = await workflow.execute_activity(
-                get_company_info_activity,
-                company_info_id,
-                retry_policy=retry_policy,
-                start_to_close_timeout=timedelta(seconds=activity_timeout)
-            )
+            company_info = params.company_info
+            if company_info is None:
+                company_info = await workflow.execute_activity(
+                    get_company_info_activity,
+                    company_info_id,
+                    retry_policy=retry_policy,
+                    start_to_close_timeout=timedelta(seconds=activity_timeout)
+                )
             
             if not company_info:
                 raise ApplicationError(f"Company info not found for ID: {company_info_id}")
             
             # Get target account details
-            target = await workflow.execute_activity(
-                get_target_account_activity,
-                target_account_id,
-                retry_policy=retry_policy,
-                start_to_close_timeout=timedelta(seconds=activity_timeout)
-            )
+            target = params.target_account
+            if target is None:
+                target = await workflow.execute_activity(
+                    get_target_account_activity,
+                    target_account_id,
+                    retry_policy=retry_policy,
+                    start_to_close_timeout=timedelta(seconds=activity_timeout)
+                )
             
             if not target:
                 raise ApplicationError(f"Target account not found for ID: {target_account_id}")
             
             # Get target account context from their website if available
-            target_context = ""
-            if target.get("url"):
+            target_context = params.target_context or ""
+            if params.target_context is None and target.get("url"):
                 target_context = await workflow.execute_activity(
                     get_contextual_information_activity,
                     target["url"],
@@ -133,25 +157,29 @@ class TargetWorkflow:
                     target_account=target,
                     target_context=target_context,
                     text=text,
-                    text_type=text_type
+                    text_type=text_type,
+                    bypass_cache=params.bypass_cache
                 ),
                 retry_policy=retry_policy,
                 start_to_close_timeout=timedelta(seconds=activity_timeout * 2)  # Longer timeout for AI generation
             )
             
-            # Save results to database
-            save_result = await workflow.execute_activity(
-                save_personalized_content_activity,
-                SaveContentInput(
-                    company_info_id=company_info_id,
-                    target_account_id=target_account_id,
-                    original_text=text,
-                    personalized_text=personalized_text,
-                    text_type=text_type
-                ),
-                retry_policy=retry_policy,
-                start_to_close_timeout=timedelta(seconds=activity_timeout)
-            )
+            # Save results to database, unless the parent saves them in bulk
+            save_result = False
+            if not params.defer_save:
+                save_result = await workflow.execute_activity(
+                    save_personalized_content_activity,
+                    SaveContentInput(
+                        company_info_id=company_info_id,
+                        target_account_id=target_account_id,
+                        original_text=text,
+                        personalized_text=personalized_text,
+                        text_type=text_type,
+                        job_key=params.job_key
+                    ),
+                    retry_policy=retry_policy,
+                    start_to_close_timeout=timedelta(seconds=activity_timeout)
+                )
             
             # Return results
             result = {
@@ -167,7 +195,8 @@ class TargetWorkflow:
                 "personalized_text": personalized_text,
                 "text_type": text_type,
                 "success": True,
-                "saved": save_result
+                "saved": save_result,
+                "config_version": config_version
             }
             
             workflow.logger.info(f"Completed target workflow for company {company_info_id}, target {target_account_id}")
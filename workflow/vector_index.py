@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Persistent, per-account vector index for scraped website chunks.
+
+Each account URL gets its own Chroma collection, named after a hash of the
+normalized URL, in a persistent client shared by the whole process.
+Re-indexing an account replaces its collection. Retrievals are filtered on the
+account URL, and Chroma's LRU segment cache bounds how many collections are
+kept in memory at once. Chroma sizes that cache by the files on disk and keeps
+loaded HNSW indexes referenced after evicting them, so the client is also
+recycled after every recycle_after indexed collections, which bounds the loaded
+indexes to that many; the collections stay on disk and are reopened on demand.
+The images set MALLOC_MMAP_THRESHOLD_ so the memory freed by a recycle goes back
+to the OS instead of fragmenting the heap.
+"""
+import gc
+import hashlib
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import List
+
+import chromadb
+from chromadb.config import Settings
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from workflow.page_fetch import normalize_url
+from workflow.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Persist HNSW segments after a few chunks instead of Chroma's default 1000, so
+# the LRU segment cache (which sizes segments by their files on disk) sees them
+COLLECTION_METADATA = {"hnsw:batch_size": 10, "hnsw:sync_threshold": 10}
+
+# Accounts are serialized through this many locks, picked by collection name, so
+# the number of locks doesn't grow with the number of accounts
+LOCK_STRIPES = 64
+
+
+class VectorIndex:
+    """Per-account Chroma collections in a persistent, memory-bounded client."""
+
+    def __init__(self, persist_directory: str, memory_limit_bytes: int, recycle_after: int = 64):
+        self.persist_directory = persist_directory
+        self.memory_limit_bytes = memory_limit_bytes
+        self.recycle_after = recycle_after
+        self._client = None
+        self._indexed = 0  # collections written since the client was created
+        self._active = 0  # lock(url) blocks in progress, which may hold the client
+        self._state = threading.Condition()
+        self._key_locks: List[threading.Lock] = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    @property
+    def client(self):
+        """Create the persistent client on first use."""
+        with self._state:
+            if self._client is None:
+                os.makedirs(self.persist_directory, exist_ok=True)
+                self._client = chromadb.PersistentClient(
+                    path=self.persist_directory,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        allow_reset=False,
+                        chroma_segment_cache_policy="LRU",
+                        chroma_memory_limit_bytes=self.memory_limit_bytes
+                    )
+                )
+            return self._client
+
+    def _recycle(self):
+        """
+        Drop the client and Chroma's cached system, releasing every loaded segment.
+        Call with _state held and no lock(url) block active.
+        """
+        if self._client is not None:
+            self._client.clear_system_cache()
+            self._client = None
+            # The old system's segments are only reachable through reference cycles
+            gc.collect()
+        self._indexed = 0
+        metrics.incr("vector_index.recycled")
+
+    @staticmethod
+    def collection_name(url: str) -> str:
+        """Collection name for an account URL, valid under Chroma's naming rules."""
+        return f"account-{hashlib.sha256(normalize_url(url).encode()).hexdigest()[:32]}"
+
+    @contextmanager
+    def lock(self, url: str):
+        """
+        Serialize indexing and retrieval for one account, so a refresh never races a query.
+        Accounts sharing a lock stripe also wait for each other.
+        """
+        name = self.collection_name(url)
+        key_lock = self._key_locks[int(name[-8:], 16) % len(self._key_locks)]
+        with key_lock:
+            with self._state:
+                if self._indexed >= self.recycle_after:
+                    # Wait for blocks using the current client, then recycle it unless another thread did
+                    self._state.wait_for(lambda: self._active == 0)
+                    if self._indexed >= self.recycle_after:
+                        self._recycle()
+                self._active += 1
+            try:
+                yield
+            finally:
+                with self._state:
+                    self._active -= 1
+                    self._state.notify_all()
+
+    def replace(self, url: str, documents: List[Document], embeddings: Embeddings) -> Chroma:
+        """
+        Replace the indexed chunks for an account and return its vector store.
+        Call inside lock(url), and only use the store within that block, since
+        the client may be recycled once it exits.
+        """
+        name = self.collection_name(url)
+        account_url = normalize_url(url)
+        try:
+            self.client.delete_collection(name)
+        except Exception:
+            # Collection did not exist yet
+            pass
+
+        for document in documents:
+            document.metadata["account_url"] = account_url
+
+        vectorstore = Chroma(
+            client=self.client,
+            collection_name=name,
+            embedding_function=embeddings,
+            collection_metadata={"account_url": account_url, **COLLECTION_METADATA}
+        )
+        if documents:
+            vectorstore.add_documents(documents)
+        with self._state:
+            self._indexed += 1
+        metrics.incr("vector_index.replaced")
+        logger.info(f"Indexed {len(documents)} chunks for {account_url} in collection {name}")
+        return vectorstore
+
+    def as_retriever(self, vectorstore: Chroma, url: str, k: int = 4):
+        """Retriever restricted to one account's chunks."""
+        return vectorstore.as_retriever(
+            search_kwargs={"k": k, "filter": {"account_url": normalize_url(url)}}
+        )
+
+
+vector_index = VectorIndex(
+    persist_directory=os.environ.get("VECTOR_INDEX_DIR", "/app/vector_index"),
+    memory_limit_bytes=int(os.environ.get("VECTOR_INDEX_MEMORY_LIMIT_BYTES", str(256 * 1024 * 1024))),
+    recycle_after=int(os.environ.get("VECTOR_INDEX_RECYCLE_AFTER", "64"))
+)
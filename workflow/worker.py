@@ -5,21 +5,31 @@ Temporal worker for ad content generation workflows.
 import asyncio
 import logging
 import os
-import yaml
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
 from temporalio.client import Client
 from temporalio.worker import Worker
 
-from workflow.common_activities import load_config_activity
+from workflow.common_activities import load_config_activity, load_config_snapshot_activity, push_workflow_progress_activity
+from workflow.config import get_config_snapshot
+from workflow.db import close_pool, get_db_connection_params, init_pool
+from workflow.metrics import metrics
+from workflow.notifications import notification_client
 from workflow.ad_content_workflow import AdContentWorkflow
 from workflow.target_workflow import TargetWorkflow
 from workflow.target_activities import (
     get_company_info_activity,
+    get_company_infos_activity,
+    get_account_ids_page_activity,
+    get_batch_jobs_page_activity,
+    delete_batch_jobs_activity,
     get_target_account_activity,
+    get_target_accounts_activity,
     get_contextual_information_activity,
     generate_personalized_content_activity,
-    save_personalized_content_activity
+    save_personalized_content_activity,
+    save_personalized_content_batch_activity
 )
 
 logging.basicConfig(
@@ -32,25 +42,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def load_config(config_file):
-    """Load configuration from YAML file."""
-    config_path = os.path.join(os.path.dirname(__file__), "config", config_file)
-    with open(config_path, "r") as f:
-        return yaml.safe_load(f)
-
-def get_db_connection_params():
-    """Get database connection parameters from environment variables."""
-    return {
-        "host": os.environ.get("DB_HOST", "db"),
-        "port": os.environ.get("DB_PORT", "5432"),
-        "dbname": os.environ.get("DB_NAME", "addb"),
-        "user": os.environ.get("DB_USER", "ad_user"),
-        "password": os.environ.get("DB_PASSWORD", "your_secure_password")
-    }
+async def report_metrics(interval_seconds):
+    """Periodically log the worker's metrics (cache hits/misses, timings)."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        logger.info(f"Worker metrics: {metrics.snapshot()}")
 
 async def main():
-    # Load main workflow config
-    config = load_config("ad_content_workflow_config.yaml")
+    # Load the config snapshot once at startup; workflows receive it as input
+    # and activities re-read the files only when their mtime changes
+    config_snapshot = get_config_snapshot()
+    config = config_snapshot.ad_content
+    logger.info(f"Loaded config version {config_snapshot.version}")
     task_queue = config.get("task_queue", "ad-composer-task-queue")
     
     # Worker configuration
@@ -65,6 +68,13 @@ async def main():
     client = await Client.connect(temporal_host)
     logger.info(f"Connected to Temporal server: {client.identity}")
     
+    # Activities are synchronous and run on this thread pool, so a slow scrape
+    # or model call only occupies its own thread instead of the event loop
+    activity_executor = ThreadPoolExecutor(
+        max_workers=max_concurrent_activities,
+        thread_name_prefix="activity"
+    )
+    
     # Create worker with concurrency settings
     worker = Worker(
         client,
@@ -72,16 +82,36 @@ async def main():
         workflows=[AdContentWorkflow, TargetWorkflow],
         activities=[
             load_config_activity,
+            load_config_snapshot_activity,
+            push_workflow_progress_activity,
             get_company_info_activity,
+            get_company_infos_activity,
+            get_account_ids_page_activity,
+            get_batch_jobs_page_activity,
+            delete_batch_jobs_activity,
             get_target_account_activity,
+            get_target_accounts_activity,
             get_contextual_information_activity,
             generate_personalized_content_activity,
-            save_personalized_content_activity
+            save_personalized_content_activity,
+            save_personalized_content_batch_activity
         ],
+        activity_executor=activity_executor,
         max_concurrent_activities=max_concurrent_activities,
         max_concurrent_workflow_tasks=max_concurrent_workflows
     )
     
+    # Create the worker-wide database pool, sized so every concurrent activity
+    # (plus the context cache's background refreshes) can hold a connection
+    pool_config = config.get("db_pool", {})
+    init_pool(
+        min_connections=pool_config.get("min_connections", 1),
+        max_connections=max_concurrent_activities + pool_config.get("extra_connections", 2),
+        max_lifetime=pool_config.get("max_lifetime", 3600),
+        health_check_interval=pool_config.get("health_check_interval", 30),
+        acquire_timeout=pool_config.get("acquire_timeout", 30)
+    )
+    
     # Log database connection info (without password)
     db_params = get_db_connection_params()
     logger.info(f"Database connection: host={db_params['host']}, port={db_params['port']}, dbname={db_params['dbname']}, user={db_params['user']}")
@@ -90,7 +120,14 @@ async def main():
     logger.info(f"Max concurrent activities: {max_concurrent_activities}")
     logger.info(f"Max concurrent workflows: {max_concurrent_workflows}")
     
-    await worker.run()
+    metrics_task = asyncio.create_task(report_metrics(config.get("metrics_report_interval", 60)))
+    try:
+        await worker.run()
+    finally:
+        metrics_task.cancel()
+        activity_executor.shutdown(wait=False)
+        close_pool()
+        await notification_client.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file